@@ -0,0 +1,32 @@
+"""Keyset pagination indexes
+
+Revision ID: 5c1e7a9d2b40
+Revises: 3fce590e0278
+Create Date: 2026-10-17 10:12:04.318215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d2b40'
+down_revision: Union[str, None] = '3fce590e0278'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Listy "po właścicielu" stronicowane po id.
+    # CREATE/DROP INDEX CONCURRENTLY nie blokuje zapisów, ale nie może działać w transakcji
+    with op.get_context().autocommit_block():
+        op.create_index('ix_services_profile_id_id', 'services', ['profile_id', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_pets_owner_id_id', 'pets', ['owner_id', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pets_owner_id_id', table_name='pets', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_services_profile_id_id', table_name='services', postgresql_concurrently=True, if_exists=True)
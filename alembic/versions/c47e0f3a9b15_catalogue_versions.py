@@ -0,0 +1,31 @@
+"""Catalogue versions
+
+Revision ID: c47e0f3a9b15
+Revises: 8f2d4b6a1c93
+Create Date: 2026-10-17 11:48:20.530671
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e0f3a9b15'
+down_revision: Union[str, None] = '8f2d4b6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('catalogue_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO catalogue_versions (name, version) VALUES ('specializations', 1)")
+
+
+def downgrade() -> None:
+    op.drop_table('catalogue_versions')
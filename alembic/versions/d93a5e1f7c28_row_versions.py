@@ -0,0 +1,34 @@
+"""Row versions for conditional requests
+
+Revision ID: d93a5e1f7c28
+Revises: c47e0f3a9b15
+Create Date: 2026-10-17 12:31:09.114852
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a5e1f7c28'
+down_revision: Union[str, None] = 'c47e0f3a9b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('profiles', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('profiles', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+    op.add_column('services', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('services', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+    op.add_column('pets', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('pets', 'version')
+    op.drop_column('services', 'updated_at')
+    op.drop_column('services', 'version')
+    op.drop_column('profiles', 'updated_at')
+    op.drop_column('profiles', 'version')
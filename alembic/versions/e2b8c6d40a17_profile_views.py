@@ -0,0 +1,35 @@
+"""Profile views
+
+Revision ID: e2b8c6d40a17
+Revises: d93a5e1f7c28
+Create Date: 2026-10-17 13:20:44.671093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8c6d40a17'
+down_revision: Union[str, None] = 'd93a5e1f7c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Widoki są budowane leniwie przy pierwszym odczycie profilu
+    op.create_table('profile_views',
+    sa.Column('profile_id', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['profile_id'], ['profiles.id'], ),
+    sa.PrimaryKeyConstraint('profile_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('profile_views')
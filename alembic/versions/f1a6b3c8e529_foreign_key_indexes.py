@@ -0,0 +1,51 @@
+"""Foreign key indexes
+
+Revision ID: f1a6b3c8e529
+Revises: e2b8c6d40a17
+Create Date: 2026-10-17 14:05:12.387420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a6b3c8e529'
+down_revision: Union[str, None] = 'e2b8c6d40a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# services.profile_id i pets.owner_id są już pokryte indeksami złożonymi
+# (profile_id, id) i (owner_id, id) z migracji 5c1e7a9d2b40
+NEW_INDEXES = [
+    ('ix_social_links_profile_id', 'social_links', ['profile_id']),
+    ('ix_service_media_service_id', 'service_media', ['service_id']),
+    ('ix_profile_specialization_specialization_id', 'profile_specialization', ['specialization_id']),
+]
+
+# Duplikaty kluczy głównych
+REDUNDANT_INDEXES = [
+    ('ix_profiles_id', 'profiles', ['id']),
+    ('ix_specializations_id', 'specializations', ['id']),
+    ('ix_social_links_id', 'social_links', ['id']),
+    ('ix_pets_id', 'pets', ['id']),
+]
+
+
+def upgrade() -> None:
+    # CREATE/DROP INDEX CONCURRENTLY nie może działać w transakcji
+    with op.get_context().autocommit_block():
+        for name, table, columns in NEW_INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT_INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _ in NEW_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -1,30 +1,54 @@
+import hashlib
 import os
+import time
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy import select
+from jose import JWTError, jwk, jwt
+from jose.constants import ALGORITHMS
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import TTLCache
 from app.db import get_db
 from app.models import Profile
 
-KEYCLOAK_CLIENT_PUBLIC_KEY = os.getenv("KEYCLOAK_CLIENT_PUBLIC_KEY", "")
+DEFAULT_KEYCLOAK_CLIENT_PUBLIC_KEY = "MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAx3V7fKMuAO055R158iL18lehMdjFOZr1P7tmvrbQK3v/9hgbB6ROhOAmT1Aj+ml7rNMb+eMeJEPvDuE5sQm9hMUAU88bWC/pqWyCIegEEWEixeItUrBZLxEsmWagF5wFc90juNxu0qXEf2r/oKuRSdWuJXRx4IRkZm24XzlTLI/z7DZUvRL3t4e/XpnLgb8dVRw/xSmrqAFnbXbRaESDpp77KhTKlhxkVBiT5rBKRwAwI3a7kEYEFtvX3wpRimGPOh/uogtbHn1wKPmFLfpcchu6eIozvWTcVPkfPPSqOwS7HyYlHUdMS+MSjKlmM9dBCh81kgxRWbXLkz0vf6dQ3QIDAQAB"
+KEYCLOAK_CLIENT_PUBLIC_KEY = (
+    os.getenv("KEYCLOAK_CLIENT_PUBLIC_KEY") or DEFAULT_KEYCLOAK_CLIENT_PUBLIC_KEY
+)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "60"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+def load_public_key(key: str):
+    if "-----BEGIN" not in key:
+        key = "-----BEGIN PUBLIC KEY-----\n" + key.strip() + "\n-----END PUBLIC KEY-----"
+    return jwk.construct(key, ALGORITHMS.RS256)
+
+
+# Klucz parsujemy raz przy starcie, a nie przy każdym żądaniu
+public_key = load_public_key(KEYCLOAK_CLIENT_PUBLIC_KEY)
+
+# Zweryfikowane tokeny (klucz: sha256 tokenu), ważne do czasu "exp"
+verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=0)
+
+# Identyfikatory profili, o których wiemy, że istnieją w bazie
+known_profiles = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+
 def verify_token(token: str = Depends(oauth2_scheme)):
+    token_hash = hashlib.sha256(token.encode()).digest()
+    decoded_token = verified_tokens.get(token_hash)
+    if decoded_token is not None:
+        return decoded_token
+
     try:
-        print("TOKEN", KEYCLOAK_CLIENT_PUBLIC_KEY)
-        public_key = (
-            "-----BEGIN PUBLIC KEY-----\n"
-            + "MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAx3V7fKMuAO055R158iL18lehMdjFOZr1P7tmvrbQK3v/9hgbB6ROhOAmT1Aj+ml7rNMb+eMeJEPvDuE5sQm9hMUAU88bWC/pqWyCIegEEWEixeItUrBZLxEsmWagF5wFc90juNxu0qXEf2r/oKuRSdWuJXRx4IRkZm24XzlTLI/z7DZUvRL3t4e/XpnLgb8dVRw/xSmrqAFnbXbRaESDpp77KhTKlhxkVBiT5rBKRwAwI3a7kEYEFtvX3wpRimGPOh/uogtbHn1wKPmFLfpcchu6eIozvWTcVPkfPPSqOwS7HyYlHUdMS+MSjKlmM9dBCh81kgxRWbXLkz0vf6dQ3QIDAQAB"
-            + "\n-----END PUBLIC KEY-----"
-        )
         decoded_token = jwt.decode(
             token, public_key, algorithms=["RS256"], options={"verify_aud": False}
         )
-        return decoded_token
-
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,15 +56,33 @@ def verify_token(token: str = Depends(oauth2_scheme)):
             headers={"WWW-Authenticate": "Bearer"},
         ) from e
 
+    exp = decoded_token.get("exp")
+    if isinstance(exp, (int, float)):
+        verified_tokens.set(token_hash, decoded_token, ttl=exp - time.time())
+    return decoded_token
+
+
+@dataclass(frozen=True)
+class CurrentProfile:
+    """Identyfikator profilu zalogowanego użytkownika (wiersz na pewno istnieje).
+
+    Handlery, które potrzebują danych profilu, czytają je same z bazy.
+    """
+
+    id: str
+
 
 async def get_current_user(
     user=Depends(verify_token), db: AsyncSession = Depends(get_db)
 ):
-    user_db = await db.execute(select(Profile).where(Profile.id == user["sub"]))
-    user_db = user_db.scalar()
-    if not user_db:
-        user_db = Profile(id=user["sub"])
-        db.add(user_db)
+    profile_id = user["sub"]
+    if profile_id not in known_profiles:
+        # Jedno zapytanie zamiast SELECT + INSERT; bezpieczne przy równoległych żądaniach
+        await db.execute(
+            insert(Profile)
+            .values(id=profile_id)
+            .on_conflict_do_nothing(index_elements=[Profile.id])
+        )
         await db.commit()
-        await db.refresh(user_db)
-    return user, user_db
+        known_profiles.set(profile_id, True)
+    return user, CurrentProfile(profile_id)
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import CatalogueVersion, Specialization
+
+CATALOGUE_CHECK_INTERVAL = float(os.getenv("CATALOGUE_CHECK_INTERVAL", "5"))
+
+
+async def bump_catalogue_version(db: AsyncSession, name: str) -> None:
+    """Wywoływane w transakcji zapisu - inne workery przeładują dane po commicie."""
+    await db.execute(
+        update(CatalogueVersion)
+        .where(CatalogueVersion.name == name)
+        .values(version=CatalogueVersion.version + 1)
+    )
+
+
+class SpecializationCatalogue:
+    """Słownik specjalizacji w pamięci, z gotową odpowiedzią JSON i ETagiem.
+
+    Wersja w tabeli catalogue_versions jest sprawdzana co CATALOGUE_CHECK_INTERVAL
+    sekund, więc zmiany z innych workerów są widoczne z takim opóźnieniem.
+    """
+
+    name = "specializations"
+
+    def __init__(self):
+        self.version: int | None = None
+        self.ids: frozenset[str] = frozenset()
+        self.body = b"[]"
+        self.etag = '""'
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        self._checked_at = 0.0
+
+    async def get(self, db: AsyncSession) -> "SpecializationCatalogue":
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < CATALOGUE_CHECK_INTERVAL:
+            return self
+
+        version = await db.scalar(
+            select(CatalogueVersion.version).where(CatalogueVersion.name == self.name)
+        )
+        if version is None or version != self.version:
+            await self.load(db, version)
+        self._checked_at = now
+        return self
+
+    async def load(self, db: AsyncSession, version: int | None) -> None:
+        result = await db.execute(select(Specialization).order_by(Specialization.id))
+        items = [
+            {
+                "id": spec.id,
+                "title": spec.title,
+                "short_description": spec.short_description,
+            }
+            for spec in result.scalars()
+        ]
+        body = json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode()
+        self.ids = frozenset(item["id"] for item in items)
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.version = version
+
+
+specializations_catalogue = SpecializationCatalogue()
@@ -0,0 +1,72 @@
+from fastapi import HTTPException, Response, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.models import Profile
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """Porównanie słabe, jak dla If-None-Match (RFC 9110, 13.1.2)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_version_etag(response: Response, version: int | None) -> None:
+    """ETag pełnej reprezentacji; niepełnej (wersja None) klient nie może cache'ować."""
+    if version is None:
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        response.headers["ETag"] = version_etag(version)
+
+
+def check_if_match(header: str | None, etag: str) -> None:
+    """If-Match przy zapisie - porównanie silne; brak nagłówka nie blokuje zapisu."""
+    if not header or header.strip() == "*":
+        return
+    if not any(candidate.strip() == etag for candidate in header.split(",")):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Zasób został zmieniony",
+            headers={"ETag": etag},
+        )
+
+
+async def commit_versioned(db: AsyncSession) -> None:
+    """Commit zapisu warunkowego po wersji (version_id_col).
+
+    UPDATE dotyczy tylko wiersza o wersji sprawdzonej z If-Match; jeśli ktoś
+    zmienił go w międzyczasie, zapis nie nadpisuje cudzej zmiany - zwracamy 412.
+    """
+    try:
+        await db.commit()
+    except StaleDataError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Zasób został zmieniony",
+        ) from e
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+async def touch_profile(db: AsyncSession, profile_id: str) -> None:
+    """Podbija wersję profilu przy zmianie danych trzymanych w innych tabelach."""
+    await db.execute(
+        update(Profile)
+        .where(Profile.id == profile_id)
+        .values(version=Profile.version + 1)
+    )
@@ -0,0 +1,98 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics import DB_QUERY_DURATION
+
+SQL_SERVER_TIMING = os.getenv("SQL_SERVER_TIMING", "false").lower() == "true"
+# Ile razy to samo zapytanie może się powtórzyć w jednym żądaniu (0 = bez ostrzeżeń)
+SQL_REPEAT_WARNING_THRESHOLD = int(os.getenv("SQL_REPEAT_WARNING_THRESHOLD", "10"))
+
+logger = logging.getLogger("sql")
+
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+@dataclass
+class QueryStats:
+    """Statystyki zapytań SQL jednego żądania."""
+
+    count: int = 0
+    duration: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def most_repeated(self) -> tuple[str, int] | None:
+        if not self.shapes:
+            return None
+        return self.shapes.most_common(1)[0]
+
+
+# Ustawiane przez QueryStatsMiddleware; poza żądaniami (worker, CLI) - None
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def statement_shape(statement: str) -> str:
+    # Parametry są już zastąpione placeholderami - zostają tylko białe znaki
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+def statement_operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in OPERATIONS else "OTHER"
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    DB_QUERY_DURATION.labels(statement_operation(statement)).observe(elapsed)
+
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        stats.shapes[statement_shape(statement)] += 1
+
+
+def handle_error(exception_context):
+    # Zapytanie zakończone błędem nie wywołuje after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+
+def server_timing(stats: QueryStats) -> bytes:
+    return f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'.encode()
+
+
+def warn_repeated(stats: QueryStats, method: str, route: str) -> None:
+    if SQL_REPEAT_WARNING_THRESHOLD <= 0:
+        return
+    repeated = stats.most_repeated()
+    if repeated and repeated[1] > SQL_REPEAT_WARNING_THRESHOLD:
+        shape, count = repeated
+        logger.warning(
+            "Możliwe N+1: %s %s wykonało to samo zapytanie %d razy: %s",
+            method,
+            route,
+            count,
+            shape[:500],
+        )
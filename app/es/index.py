@@ -1,3 +1,76 @@
+import asyncio
+import logging
+
+from elasticsearch import BadRequestError, NotFoundError, helpers
+
+from app.keycloak_api import get_keycloak_user
+
+logger = logging.getLogger("es")
+
+USERS_ALIAS = "users"
+# Podbijamy przy każdej niekompatybilnej zmianie mapowania
+USERS_INDEX_VERSION = 2
+
+USERS_INDEX_BODY = {
+    "settings": {
+        "number_of_shards": 1,
+        "number_of_replicas": 0,
+        "analysis": {
+            "tokenizer": {
+                "autocomplete": {
+                    "type": "edge_ngram",
+                    "min_gram": 1,
+                    "max_gram": 20,
+                    "token_chars": ["letter", "digit"],
+                }
+            },
+            "analyzer": {
+                "autocomplete": {
+                    "type": "custom",
+                    "tokenizer": "autocomplete",
+                    "filter": ["lowercase"],
+                }
+            },
+        },
+    },
+    "mappings": {
+        "properties": {
+            "id": {"type": "keyword"},
+            "specializations": {"type": "keyword"},
+            "location": {"type": "text", "fields": {"raw": {"type": "keyword"}}},
+            "picture": {"type": "keyword", "index": False},
+            "username": {
+                "type": "text",
+                "fields": {
+                    "autocomplete": {
+                        "type": "text",
+                        "analyzer": "autocomplete",
+                        "search_analyzer": "standard",
+                    }
+                },
+            },
+            "about_me": {
+                "type": "text",
+                "fields": {
+                    "autocomplete": {
+                        "type": "text",
+                        "analyzer": "autocomplete",
+                        "search_analyzer": "standard",
+                    }
+                },
+            },
+        }
+    },
+}
+
+USERS_SEARCH_FIELDS = [
+    "username^2",
+    "username.autocomplete^2",
+    "about_me",
+    "about_me.autocomplete",
+]
+
+
 async def init_indices(es_client):
     await init_user_index(es_client)
     return True
@@ -5,31 +78,131 @@ async def init_indices(es_client):
 
 async def create_index_if_not_exists(es_client, index_name, index_body):
     if not await es_client.indices.exists(index=index_name):
-        await es_client.indices.create(index=index_name, body=index_body)
+        try:
+            await es_client.indices.create(index=index_name, body=index_body)
+        except BadRequestError as e:
+            # Inny worker mógł utworzyć indeks w międzyczasie
+            if e.error != "resource_already_exists_exception":
+                raise
 
 
 async def init_user_index(es_client):
-    index_name = "users"
-    index_body = {
-        "settings": {
-            "number_of_shards": 1,
-            "number_of_replicas": 0,
-        },
-        "mappings": {
-            "properties": {
-                "username": {"type": "text"},
-                "about_me": {"type": "text"},
-            }
-        },
-    }
+    if await es_client.indices.exists_alias(name=USERS_ALIAS):
+        # Nowe pola dokładamy do istniejącego indeksu bez przebudowy
+        try:
+            await es_client.indices.put_mapping(
+                index=USERS_ALIAS,
+                properties=USERS_INDEX_BODY["mappings"]["properties"],
+            )
+        except BadRequestError:
+            logger.warning(
+                "Mapowanie indeksu %s jest niezgodne - uruchom app.es.reindex",
+                USERS_ALIAS,
+            )
+        return True
 
-    await create_index_if_not_exists(es_client, index_name, index_body)
+    index_name = f"{USERS_ALIAS}_v{USERS_INDEX_VERSION}"
+    await create_index_if_not_exists(es_client, index_name, USERS_INDEX_BODY)
+
+    actions = [{"add": {"index": index_name, "alias": USERS_ALIAS}}]
+    if await es_client.indices.exists(index=USERS_ALIAS):
+        # Migracja starego indeksu "users" (bez aliasu) do nowego mapowania
+        await es_client.reindex(
+            source={"index": USERS_ALIAS},
+            dest={"index": index_name},
+            wait_for_completion=True,
+            refresh=True,
+        )
+        actions.insert(0, {"remove_index": {"index": USERS_ALIAS}})
+
+    try:
+        await es_client.indices.update_aliases(actions=actions)
+    except NotFoundError:
+        # Stary indeks usunął już inny worker
+        if not await es_client.indices.exists_alias(name=USERS_ALIAS):
+            raise
     return True
 
 
-async def index_user(es_client, user_id: str, username: str, about_me: str):
-    await es_client.index(
-        index="users",
-        id=user_id,
-        body={"id": user_id, "username": username, "about_me": about_me},
+def users_query(query: str) -> dict:
+    query = query.strip()
+    if not query:
+        return {"match_all": {}}
+    return {
+        "multi_match": {
+            "query": query,
+            "fields": USERS_SEARCH_FIELDS,
+            "type": "most_fields",
+        }
+    }
+
+
+def user_document(profile, user_data: dict | None) -> dict:
+    user_data = user_data or {}
+    username = " ".join(
+        part for part in (user_data.get("firstName"), user_data.get("lastName")) if part
+    )
+    return {
+        "id": profile.id,
+        "username": username,
+        "about_me": profile.about_me or "",
+        "location": profile.location or "",
+        "picture": profile.picture,
+        "specializations": [spec.id for spec in profile.specializations],
+    }
+
+
+async def build_user_documents(profiles, keycloak_semaphore: asyncio.Semaphore):
+    """Dokumenty profili; None dla profili, których nie udało się pobrać z Keycloak.
+
+    Niepełnej migawki nie indeksujemy z prawdziwą wersją - ponowienie z tą samą
+    wersją dostałoby 409 i nazwa zostałaby pusta do następnej edycji profilu.
+    """
+
+    async def fetch(profile_id: str):
+        async with keycloak_semaphore:
+            try:
+                return await get_keycloak_user(profile_id)
+            except Exception:
+                logger.warning("Brak użytkownika %s w Keycloak", profile_id)
+                return None
+
+    users_data = await asyncio.gather(*(fetch(profile.id) for profile in profiles))
+    return [
+        None if user_data is None else user_document(profile, user_data)
+        for profile, user_data in zip(profiles, users_data)
+    ]
+
+
+def user_actions(profiles, documents):
+    """Akcje bulk z wersją profilu jako wersją zewnętrzną dokumentu.
+
+    Elasticsearch odrzuci (409) zapis starszej migawki profilu, więc kolejność,
+    w jakiej równoległe workery wysyłają dokumenty, nie ma znaczenia.
+    """
+    for profile, doc in zip(profiles, documents):
+        if doc is None:
+            continue
+        yield {
+            "_id": doc["id"],
+            "_source": doc,
+            "version": profile.version,
+            "version_type": "external",
+        }
+
+
+async def bulk_index_users(es_client, actions, index: str, **kwargs) -> int:
+    """async_bulk, w którym konflikt wersji (nowszy dokument już jest) to sukces."""
+    indexed, errors = await helpers.async_bulk(
+        es_client, actions, index=index, raise_on_error=False, **kwargs
     )
+    failures = [
+        error
+        for error in errors
+        if next(iter(error.values()), {}).get("status") != 409
+    ]
+    if failures:
+        raise helpers.BulkIndexError(
+            f"{len(failures)} document(s) failed to index.", failures
+        )
+    return indexed
@@ -0,0 +1,76 @@
+"""Worker w tle przenoszący zmiany profili z tabeli search_outbox do Elasticsearch."""
+import asyncio
+import logging
+import os
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import selectinload
+
+from app.db import get_sessionmaker
+from app.es.index import (
+    USERS_ALIAS,
+    build_user_documents,
+    bulk_index_users,
+    user_actions,
+)
+from app.keycloak_api import invalidate_keycloak_user
+from app.models import Profile, SearchOutbox
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_KEYCLOAK_CONCURRENCY = int(os.getenv("OUTBOX_KEYCLOAK_CONCURRENCY", "8"))
+
+logger = logging.getLogger("indexer")
+
+
+async def drain_outbox(es, session_factory, keycloak_semaphore) -> int:
+    async with session_factory() as session, session.begin():
+        # SKIP LOCKED pozwala kilku workerom pracować równolegle
+        result = await session.execute(
+            select(SearchOutbox.id, SearchOutbox.profile_id)
+            .order_by(SearchOutbox.id)
+            .limit(OUTBOX_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        rows = result.all()
+        if not rows:
+            return 0
+
+        # Wiele zmian tego samego profilu daje jeden dokument
+        profile_ids = list(dict.fromkeys(row.profile_id for row in rows))
+        for profile_id in profile_ids:
+            invalidate_keycloak_user(profile_id)
+
+        result = await session.execute(
+            select(Profile)
+            .options(selectinload(Profile.specializations))
+            .where(Profile.id.in_(profile_ids))
+        )
+        profiles = result.scalars().all()
+        documents = await build_user_documents(profiles, keycloak_semaphore)
+        await bulk_index_users(es, user_actions(profiles, documents), USERS_ALIAS)
+
+        # Profile bez danych z Keycloak zostają w outboxie do kolejnej próby
+        retry = {
+            profile.id for profile, doc in zip(profiles, documents) if doc is None
+        }
+        done = [row.id for row in rows if row.profile_id not in retry]
+        if done:
+            await session.execute(delete(SearchOutbox).where(SearchOutbox.id.in_(done)))
+        return len(done)
+
+
+async def run_outbox_worker(es):
+    session_factory = get_sessionmaker()
+    keycloak_semaphore = asyncio.Semaphore(OUTBOX_KEYCLOAK_CONCURRENCY)
+    while True:
+        try:
+            processed = await drain_outbox(es, session_factory, keycloak_semaphore)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Błąd podczas indeksowania zmian z outboxa")
+            processed = 0
+
+        if processed < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
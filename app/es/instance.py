@@ -1,7 +1,57 @@
+import os
 from elasticsearch import AsyncElasticsearch
 
-es_host = "http://elasticsearch:9200"
+from app.instrumentation import instrument_elasticsearch
 
+ES_HOST = os.getenv("ES_HOST", "http://elasticsearch:9200")
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "25"))
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "10"))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+ES_RETRY_ON_TIMEOUT = os.getenv("ES_RETRY_ON_TIMEOUT", "true").lower() == "true"
+ES_SNIFF_ON_START = os.getenv("ES_SNIFF_ON_START", "false").lower() == "true"
+ES_SNIFF_ON_NODE_FAILURE = (
+    os.getenv("ES_SNIFF_ON_NODE_FAILURE", "false").lower() == "true"
+)
+ES_SNIFF_TIMEOUT = float(os.getenv("ES_SNIFF_TIMEOUT", "1"))
 
-def get_es_instance():
-    return AsyncElasticsearch(hosts=[es_host])
+es_client: AsyncElasticsearch | None = None
+
+
+def create_es_client() -> AsyncElasticsearch:
+    client = AsyncElasticsearch(
+        hosts=[ES_HOST],
+        connections_per_node=ES_CONNECTIONS_PER_NODE,
+        request_timeout=ES_REQUEST_TIMEOUT,
+        max_retries=ES_MAX_RETRIES,
+        retry_on_timeout=ES_RETRY_ON_TIMEOUT,
+        sniff_on_start=ES_SNIFF_ON_START,
+        sniff_on_node_failure=ES_SNIFF_ON_NODE_FAILURE,
+        sniff_timeout=ES_SNIFF_TIMEOUT,
+    )
+    # Czas, błędy i współbieżność każdej operacji trafiają do /metrics
+    return instrument_elasticsearch(client)
+
+
+def init_es() -> AsyncElasticsearch:
+    """Tworzy wspólnego klienta dla całego procesu."""
+    global es_client
+    if es_client is None:
+        es_client = create_es_client()
+    return es_client
+
+
+def set_es(client: AsyncElasticsearch) -> None:
+    """Podmienia wspólnego klienta (np. na atrapę w benchmarkach)."""
+    global es_client
+    es_client = instrument_elasticsearch(client)
+
+
+async def close_es():
+    global es_client
+    if es_client is not None:
+        await es_client.close()
+    es_client = None
+
+
+def get_es() -> AsyncElasticsearch:
+    return init_es()
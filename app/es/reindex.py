@@ -0,0 +1,215 @@
+"""Pełna przebudowa indeksu użytkowników z Postgresa.
+
+    python -m app.es.reindex --chunk-size 500 --concurrency 4
+
+Profile są czytane kursorem po stronie serwera, dokumenty trafiają do nowego,
+wersjonowanego indeksu, a alias "users" jest przepinany atomowo na końcu.
+Zmiany zapisane w trakcie przebudowy trafiają przez outbox do starego indeksu,
+więc po przepięciu profile zmienione od startu są indeksowane ponownie.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from app.db import close_db, get_sessionmaker
+from app.es.index import (
+    USERS_ALIAS,
+    USERS_INDEX_BODY,
+    USERS_INDEX_VERSION,
+    build_user_documents,
+    bulk_index_users,
+    user_actions,
+)
+from app.es.instance import create_es_client
+from app.keycloak_api import invalidate_keycloak_user
+from app.models import Profile, SearchOutbox
+
+# Zapas na transakcje zapisu rozpoczęte przed startem, a zatwierdzone po nim
+# (updated_at to czas rozpoczęcia transakcji)
+REINDEX_REPLAY_MARGIN = float(os.getenv("REINDEX_REPLAY_MARGIN", "60"))
+
+logger = logging.getLogger("reindex")
+
+
+async def swap_users_alias(es, index_name: str, delete_old: bool = True):
+    old_indices = []
+    if await es.indices.exists_alias(name=USERS_ALIAS):
+        old_indices = list((await es.indices.get_alias(name=USERS_ALIAS)).keys())
+
+    actions = [{"remove": {"index": old, "alias": USERS_ALIAS}} for old in old_indices]
+    actions.append({"add": {"index": index_name, "alias": USERS_ALIAS}})
+    if not old_indices and await es.indices.exists(index=USERS_ALIAS):
+        # Stary indeks bez aliasu
+        actions.insert(0, {"remove_index": {"index": USERS_ALIAS}})
+    await es.indices.update_aliases(actions=actions)
+
+    if delete_old:
+        for old in old_indices:
+            if old != index_name:
+                await es.options(ignore_status=404).indices.delete(index=old)
+
+
+async def replay_changed_profiles(
+    es, session_factory, index_name: str, since, keycloak_semaphore, chunk_size: int
+) -> tuple[int, list[str]]:
+    """Indeksuje ponownie profile zmienione od "since"; zwraca (liczbę, pominięte).
+
+    Wersje zewnętrzne sprawiają, że ponowny zapis dokumentu, który worker
+    zdążył już zaktualizować, kończy się 409 zamiast cofnięcia zmian.
+    """
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Profile)
+            .options(selectinload(Profile.specializations))
+            .where(Profile.updated_at >= since)
+            .order_by(Profile.id)
+        )
+        profiles = result.scalars().all()
+        for profile in profiles:
+            # Dane z Keycloak w cache pochodzą z przebiegu głównego
+            invalidate_keycloak_user(profile.id)
+        documents = await build_user_documents(profiles, keycloak_semaphore)
+        actions = list(user_actions(profiles, documents))
+        missing = [
+            profile.id for profile, doc in zip(profiles, documents) if doc is None
+        ]
+    await bulk_index_users(es, actions, index_name, chunk_size=chunk_size)
+    return len(actions), missing
+
+
+async def reindex_users(
+    es,
+    chunk_size: int = 500,
+    concurrency: int = 4,
+    db_batch_size: int = 1000,
+    keycloak_concurrency: int = 16,
+    replicas: int = 0,
+    delete_old: bool = True,
+) -> str:
+    index_name = f"{USERS_ALIAS}_v{USERS_INDEX_VERSION}_{int(time.time())}"
+    body = {
+        **USERS_INDEX_BODY,
+        "settings": {
+            **USERS_INDEX_BODY["settings"],
+            # Na czas ładowania wyłączamy odświeżanie i repliki
+            "refresh_interval": "-1",
+            "number_of_replicas": 0,
+        },
+    }
+    await es.indices.create(index=index_name, body=body)
+    logger.info("Indeksowanie do %s", index_name)
+
+    bulk_slots = asyncio.Semaphore(concurrency)
+    keycloak_semaphore = asyncio.Semaphore(keycloak_concurrency)
+    pending: set[asyncio.Task] = set()
+    errors: list[Exception] = []
+    # Profile bez danych z Keycloak - po przepięciu aliasu ponowi je worker outboxa
+    missing: list[str] = []
+    indexed = 0
+
+    async def push(actions):
+        try:
+            await bulk_index_users(es, actions, index_name, chunk_size=chunk_size)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            bulk_slots.release()
+
+    session_factory = get_sessionmaker()
+    async with session_factory() as session:
+        # Czas bazy, a nie procesu - porównujemy go z updated_at
+        started_at = await session.scalar(select(func.localtimestamp()))
+        result = await session.stream(
+            select(Profile)
+            .options(selectinload(Profile.specializations))
+            .order_by(Profile.id)
+            .execution_options(yield_per=db_batch_size)
+        )
+        async for profiles in result.scalars().partitions():
+            documents = await build_user_documents(profiles, keycloak_semaphore)
+            missing.extend(
+                profile.id for profile, doc in zip(profiles, documents) if doc is None
+            )
+            # Akcje materializujemy teraz - po expunge_all profile są odłączone
+            actions = list(user_actions(profiles, documents))
+            # Ogranicza liczbę partii w pamięci do "concurrency"
+            await bulk_slots.acquire()
+            task = asyncio.create_task(push(actions))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            indexed += len(actions)
+            session.expunge_all()
+            logger.info("Przetworzono %d profili", indexed)
+
+            if errors:
+                break
+
+    if pending:
+        await asyncio.gather(*pending)
+    if errors:
+        await es.options(ignore_status=404).indices.delete(index=index_name)
+        raise errors[0]
+
+    await es.indices.put_settings(
+        index=index_name,
+        settings={"refresh_interval": None, "number_of_replicas": replicas},
+    )
+    await es.indices.refresh(index=index_name)
+    await swap_users_alias(es, index_name, delete_old=delete_old)
+    # Od teraz worker outboxa pisze do nowego indeksu; zmiany z czasu przebudowy
+    # poszły do starego, więc dogrywamy je tutaj
+    replayed, replay_missing = await replay_changed_profiles(
+        es,
+        session_factory,
+        index_name,
+        started_at - timedelta(seconds=REINDEX_REPLAY_MARGIN),
+        keycloak_semaphore,
+        chunk_size,
+    )
+    missing.extend(replay_missing)
+    logger.info("Ponownie zindeksowano %d profili zmienionych w trakcie", replayed)
+    if missing:
+        async with session_factory() as session:
+            session.add_all(SearchOutbox(profile_id=profile_id) for profile_id in missing)
+            await session.commit()
+        logger.warning(
+            "%d profili bez danych z Keycloak przekazano do outboxa", len(missing)
+        )
+    logger.info("Alias %s wskazuje na %s (%d dokumentów)", USERS_ALIAS, index_name, indexed)
+    return index_name
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--db-batch-size", type=int, default=1000)
+    parser.add_argument("--keycloak-concurrency", type=int, default=16)
+    parser.add_argument("--replicas", type=int, default=0)
+    parser.add_argument("--keep-old", action="store_true")
+    args = parser.parse_args()
+
+    es = create_es_client()
+    try:
+        await reindex_users(
+            es,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+            db_batch_size=args.db_batch_size,
+            keycloak_concurrency=args.keycloak_concurrency,
+            replicas=args.replicas,
+            delete_old=not args.keep_old,
+        )
+    finally:
+        await es.close()
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
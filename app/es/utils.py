@@ -1,12 +1,3 @@
-import asyncio
-
-
-async def wait_for_elasticsearch(es_client, timeout: int = 60):
-    for _ in range(timeout):
-        try:
-            if await es_client.ping():
-                return True
-        except Exception:
-            pass
-        await asyncio.sleep(1)
-    return False
+async def ping_elasticsearch(es_client):
+    if not await es_client.ping():
+        raise ConnectionError("Elasticsearch nie odpowiada")
@@ -0,0 +1,169 @@
+"""Inicjalizacja zależności w tle oraz stan zdrowia dla /healthz i /readyz.
+
+Baza, Elasticsearch i MinIO są inicjalizowane równolegle, każda z wykładniczym
+opóźnieniem między próbami, więc aplikacja odpowiada na /healthz od razu po
+starcie procesu, a /readyz zwraca 200 dopiero, gdy wymagane zależności działają.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+
+from app.db import get_sessionmaker
+from app.es.index import init_indices
+from app.es.utils import ping_elasticsearch
+from app.minio import MINIO_BUCKET, get_minio_client, init_minio_bucket
+
+STARTUP_BACKOFF_INITIAL = float(os.getenv("STARTUP_BACKOFF_INITIAL", "0.5"))
+STARTUP_BACKOFF_MAX = float(os.getenv("STARTUP_BACKOFF_MAX", "30"))
+# Jak długo wynik sprawdzenia zależności jest ważny dla kolejnych /readyz
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+READINESS_DEPENDENCIES = [
+    name.strip()
+    for name in os.getenv(
+        "READINESS_DEPENDENCIES", "database,elasticsearch,minio"
+    ).split(",")
+    if name.strip()
+]
+
+logger = logging.getLogger("health")
+
+
+@dataclass
+class DependencyState:
+    name: str
+    initialize: Callable[[], Awaitable[None]]
+    probe: Callable[[], Awaitable[None]]
+    initialized: asyncio.Event = field(default_factory=asyncio.Event)
+    attempts: int = 0
+    healthy: bool = False
+    error: str | None = None
+    checked_at: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def describe(self) -> dict:
+        return {
+            "initialized": self.initialized.is_set(),
+            "healthy": self.healthy,
+            "attempts": self.attempts,
+            "error": self.error,
+            "checked_at": self.checked_at or None,
+        }
+
+
+class Dependencies:
+    def __init__(self):
+        self.states: dict[str, DependencyState] = {}
+        self.tasks: list[asyncio.Task] = []
+
+    def register(self, name: str, initialize, probe) -> None:
+        self.states[name] = DependencyState(name, initialize, probe)
+
+    async def _initialize(self, state: DependencyState) -> None:
+        delay = STARTUP_BACKOFF_INITIAL
+        while True:
+            state.attempts += 1
+            try:
+                await state.initialize()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                state.healthy = False
+                state.error = f"{type(e).__name__}: {e}"
+                logger.warning(
+                    "Inicjalizacja %s nieudana (próba %d), ponowienie za %.1fs: %s",
+                    state.name,
+                    state.attempts,
+                    delay,
+                    state.error,
+                )
+                # Losowy rozrzut, żeby repliki nie uderzały w zależność jednocześnie
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, STARTUP_BACKOFF_MAX)
+                continue
+
+            state.healthy = True
+            state.error = None
+            state.checked_at = time.time()
+            state.initialized.set()
+            logger.info("%s gotowe po %d próbach", state.name, state.attempts)
+            return
+
+    def start(self) -> None:
+        self.tasks = [
+            asyncio.create_task(self._initialize(state))
+            for state in self.states.values()
+        ]
+
+    async def wait_for(self, *names: str) -> None:
+        await asyncio.gather(*(self.states[name].initialized.wait() for name in names))
+
+    async def check(self, state: DependencyState) -> None:
+        if not state.initialized.is_set():
+            return
+        async with state.lock:
+            # Równoległe /readyz korzystają z jednego, świeżego wyniku
+            if time.time() - state.checked_at < HEALTH_CHECK_INTERVAL:
+                return
+            try:
+                await asyncio.wait_for(state.probe(), HEALTH_CHECK_TIMEOUT)
+            except Exception as e:
+                state.healthy = False
+                state.error = f"{type(e).__name__}: {e}"
+            else:
+                state.healthy = True
+                state.error = None
+            state.checked_at = time.time()
+
+    async def readiness(self) -> tuple[bool, dict]:
+        await asyncio.gather(*(self.check(state) for state in self.states.values()))
+        report = {name: state.describe() for name, state in self.states.items()}
+        ready = all(
+            name in self.states
+            and self.states[name].initialized.is_set()
+            and self.states[name].healthy
+            for name in READINESS_DEPENDENCIES
+        )
+        return ready, report
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+async def ping_database() -> None:
+    async with get_sessionmaker()() as session:
+        await session.execute(text("SELECT 1"))
+
+
+async def check_minio_bucket() -> None:
+    if not await asyncio.to_thread(get_minio_client().bucket_exists, MINIO_BUCKET):
+        raise RuntimeError(f"Brak bucketu {MINIO_BUCKET}")
+
+
+def create_dependencies(es) -> Dependencies:
+    async def init_elasticsearch():
+        await ping_elasticsearch(es)
+        await init_indices(es)
+
+    dependencies = Dependencies()
+    dependencies.register("database", ping_database, ping_database)
+    dependencies.register(
+        "elasticsearch", init_elasticsearch, lambda: ping_elasticsearch(es)
+    )
+    # Klient MinIO jest synchroniczny - nie blokujemy pętli zdarzeń
+    dependencies.register(
+        "minio", lambda: asyncio.to_thread(init_minio_bucket), check_minio_bucket
+    )
+    return dependencies
+
+
+dependencies: Dependencies | None = None
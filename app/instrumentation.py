@@ -0,0 +1,151 @@
+import asyncio
+import inspect
+import time
+
+from app.metrics import (
+    DEPENDENCY_ERRORS,
+    DEPENDENCY_IN_PROGRESS,
+    DEPENDENCY_LATENCY,
+    EVENT_LOOP_BLOCKED,
+)
+
+
+class ClientSideError(Exception):
+    """Błąd po naszej stronie zgłoszony w trakcie wywołania zależności.
+
+    Np. strumień przekazany do put_object przerywa upload za dużego pliku -
+    to błąd klienta API, a nie awaria MinIO, więc nie trafia do dependency_errors.
+    """
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class InstrumentedClient:
+    """Cienka otoczka klienta zależności zewnętrznej, mierząca każde wywołanie.
+
+    Działa dla metod synchronicznych (KeycloakAdmin, Minio - zwykle wołanych
+    przez asyncio.to_thread) i zwracających awaitable (AsyncElasticsearch).
+    Synchroniczne wywołanie wykonane w wątku pętli zdarzeń jest dodatkowo
+    liczone jako czas jej zablokowania.
+
+    namespaces - atrybuty będące pod-klientami (np. es.indices),
+    chained - metody zwracające nowego klienta (np. es.options()).
+    """
+
+    def __init__(
+        self,
+        client,
+        dependency: str,
+        namespaces: frozenset[str] = frozenset(),
+        chained: frozenset[str] = frozenset(),
+        prefix: str = "",
+    ):
+        self._client = client
+        self._dependency = dependency
+        self._namespaces = namespaces
+        self._chained = chained
+        self._prefix = prefix
+        self._wrapped: dict[str, object] = {}
+
+    @property
+    def wrapped_client(self):
+        return self._client
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            return getattr(self._client, name)
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+
+        attribute = getattr(self._client, name)
+        if name in self._namespaces:
+            wrapped = InstrumentedClient(
+                attribute,
+                self._dependency,
+                chained=self._chained,
+                prefix=f"{self._prefix}{name}.",
+            )
+        elif name in self._chained:
+            wrapped = self._chain(attribute)
+        elif callable(attribute):
+            wrapped = self._measure(attribute, f"{self._prefix}{name}")
+        else:
+            return attribute
+        self._wrapped[name] = wrapped
+        return wrapped
+
+    def _chain(self, method):
+        def call(*args, **kwargs):
+            return InstrumentedClient(
+                method(*args, **kwargs),
+                self._dependency,
+                namespaces=self._namespaces,
+                chained=self._chained,
+                prefix=self._prefix,
+            )
+
+        return call
+
+    def _measure(self, method, operation: str):
+        dependency = self._dependency
+        latency = DEPENDENCY_LATENCY.labels(dependency, operation)
+        in_progress = DEPENDENCY_IN_PROGRESS.labels(dependency, operation)
+
+        def failed(e: Exception):
+            if not isinstance(e, ClientSideError):
+                DEPENDENCY_ERRORS.labels(dependency, operation, type(e).__name__).inc()
+
+        async def finish(awaitable, start: float):
+            try:
+                return await awaitable
+            except Exception as e:
+                failed(e)
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+                in_progress.dec()
+
+        def call(*args, **kwargs):
+            in_progress.inc()
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                failed(e)
+                latency.observe(time.perf_counter() - start)
+                in_progress.dec()
+                raise
+
+            if inspect.isawaitable(result):
+                return finish(result, start)
+
+            elapsed = time.perf_counter() - start
+            latency.observe(elapsed)
+            in_progress.dec()
+            if on_event_loop():
+                EVENT_LOOP_BLOCKED.labels(dependency, operation).inc(elapsed)
+            return result
+
+        return call
+
+
+def instrument(client, dependency: str, **kwargs) -> InstrumentedClient:
+    if isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client, dependency, **kwargs)
+
+
+def instrument_elasticsearch(client) -> InstrumentedClient:
+    return instrument(
+        client,
+        "elasticsearch",
+        namespaces=frozenset({"indices"}),
+        chained=frozenset({"options"}),
+    )
@@ -1,18 +1,90 @@
+import asyncio
+import os
 from keycloak.keycloak_admin import KeycloakAdmin
 import logging
 
+from app.cache import TTLCache
+from app.instrumentation import instrument
+from app.metrics import KEYCLOAK_USER_CACHE
+
 logging.basicConfig(level=logging.DEBUG)
 
 logger = logging.getLogger("keycloak")
 logger.setLevel(logging.DEBUG)
 
-keycloak_admin = KeycloakAdmin(
-    server_url="http://keycloak:8080/",
-    client_id="admin-cli",
-    client_secret_key="wSVxDu1FL5SIbdDlqEpr9wohnB8bxYO7",
-    realm_name="paw_connect",
-    verify=False,
+KEYCLOAK_SERVER_URL = os.getenv("KEYCLOAK_SERVER_URL", "http://keycloak:8080/")
+KEYCLOAK_ADMIN_CLIENT_ID = os.getenv("KEYCLOAK_ADMIN_CLIENT_ID", "admin-cli")
+KEYCLOAK_ADMIN_CLIENT_SECRET = os.getenv(
+    "KEYCLOAK_ADMIN_CLIENT_SECRET", "wSVxDu1FL5SIbdDlqEpr9wohnB8bxYO7"
 )
+KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM", "paw_connect")
+
+keycloak_admin = None
+
+
+def create_keycloak_admin():
+    return instrument(
+        KeycloakAdmin(
+            server_url=KEYCLOAK_SERVER_URL,
+            client_id=KEYCLOAK_ADMIN_CLIENT_ID,
+            client_secret_key=KEYCLOAK_ADMIN_CLIENT_SECRET,
+            realm_name=KEYCLOAK_REALM,
+            verify=False,
+        ),
+        "keycloak",
+    )
+
+
+def get_keycloak_admin():
+    global keycloak_admin
+    if keycloak_admin is None:
+        keycloak_admin = create_keycloak_admin()
+    return keycloak_admin
+
+
+def set_keycloak_admin(admin) -> None:
+    """Podmienia klienta administracyjnego (np. na atrapę w benchmarkach)."""
+    global keycloak_admin
+    keycloak_admin = instrument(admin, "keycloak")
+    keycloak_users.clear()
+
+
+KEYCLOAK_USER_CACHE_SIZE = int(os.getenv("KEYCLOAK_USER_CACHE_SIZE", "10000"))
+KEYCLOAK_USER_CACHE_TTL = float(os.getenv("KEYCLOAK_USER_CACHE_TTL", "60"))
+
+keycloak_users = TTLCache(
+    maxsize=KEYCLOAK_USER_CACHE_SIZE, ttl=KEYCLOAK_USER_CACHE_TTL
+)
+
+
+async def get_keycloak_user(user_id: str) -> dict:
+    user = keycloak_users.get(user_id)
+    if user is not None:
+        KEYCLOAK_USER_CACHE.labels("hit").inc()
+        return user
+
+    KEYCLOAK_USER_CACHE.labels("miss").inc()
+    # KeycloakAdmin jest synchroniczny - nie blokujemy pętli zdarzeń
+    user = await asyncio.to_thread(get_keycloak_admin().get_user, user_id)
+    keycloak_users.set(user_id, user)
+    return user
+
+
+def invalidate_keycloak_user(user_id: str) -> None:
+    keycloak_users.pop(user_id)
+
+
+async def update_keycloak_user(user_id: str, payload: dict):
+    invalidate_keycloak_user(user_id)
+    try:
+        return await asyncio.to_thread(
+            get_keycloak_admin().update_user, user_id, payload
+        )
+    finally:
+        # Odczyt równoległy z zapisem mógł wstawić starą reprezentację
+        invalidate_keycloak_user(user_id)
+
+
 # ustawiwnia admin-cli
 #   - Client authentication - on
 #   - Authorization Enabled - on
@@ -1,35 +1,56 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from app.minio import init_minio_bucket
+from app import health
+from app.db import close_db, init_db
+from app.metrics import cleanup_dead_workers
+from app.middleware import PrometheusMiddleware, QueryStatsMiddleware
 from app.routers import users
 from app.routers import specializations
 from app.routers import socials
 from app.routers import metrics
-from app.es.index import init_indices
-from app.es.instance import get_es_instance
-from app.es.utils import wait_for_elasticsearch
+from app.routers import health as health_router
+from app.es.indexer import run_outbox_worker
+from app.es.instance import close_es, init_es
 from fastapi import FastAPI, Response
 
 from app.routers import services
 from app.routers import pets
 
 
-es = get_es_instance()
+async def start_indexer(dependencies: health.Dependencies, es):
+    # Outbox wymaga bazy i indeksu - startuje, gdy tylko obie są gotowe
+    await dependencies.wait_for("database", "elasticsearch")
+    await run_outbox_worker(es)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    if not await wait_for_elasticsearch(es):
-        raise Exception("Elasticsearch is not available after waiting")
+    cleanup_dead_workers()
+    init_db()
+    es = init_es()
 
-    await init_indices(es)
-
-    init_minio_bucket()
+    # Zależności inicjalizują się w tle; /healthz działa od razu,
+    # a /readyz przechodzi na 200, gdy wymagane zależności są gotowe
+    dependencies = health.create_dependencies(es)
+    health.dependencies = dependencies
+    dependencies.start()
+    indexer = asyncio.create_task(start_indexer(dependencies, es))
 
     yield
 
+    indexer.cancel()
+    with suppress(asyncio.CancelledError):
+        await indexer
+    await dependencies.stop()
+    health.dependencies = None
+    await close_es()
+    await close_db()
+
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(PrometheusMiddleware)
 
 app.include_router(users.router)
 app.include_router(specializations.router)
@@ -37,3 +58,4 @@ app.include_router(metrics.router)
 app.include_router(socials.router)
 app.include_router(services.router)
 app.include_router(pets.router)
+app.include_router(health_router.router)
@@ -1,3 +1,136 @@
-from prometheus_client import Counter
+import glob
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    Summary,
+    multiprocess,
+)
+
+# Przy wielu workerach (uvicorn --workers / gunicorn) każdy proces zapisuje
+# metryki do plików w tym katalogu, a /metrics agreguje je wszystkie.
+# prometheus_client czyta tę zmienną sam - musi być ustawiona przed startem.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
 
 REQUEST_COUNT = Counter("request_count", "Ilość żądań")
+
+KEYCLOAK_USER_CACHE = Counter(
+    "keycloak_user_cache_requests",
+    "Odczyty użytkowników Keycloak z cache (hit/miss)",
+    ["result"],
+)
+
+HTTP_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0
+)
+
+# Ograniczone do szablonów ścieżek (np. /api/services/{service_id}), nie surowych URL
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Czas obsługi żądania HTTP",
+    ["route", "method", "status"],
+    buckets=HTTP_LATENCY_BUCKETS,
+)
+
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Liczba żądań HTTP w trakcie obsługi",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+HTTP_RESPONSE_SIZE = Summary(
+    "http_response_size_bytes",
+    "Rozmiar treści odpowiedzi HTTP",
+    ["route", "method"],
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Czas wykonania pojedynczego zapytania SQL",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Liczba zapytań SQL wykonanych podczas jednego żądania HTTP",
+    ["route", "method"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50, 100),
+)
+
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds",
+    "Łączny czas zapytań SQL podczas jednego żądania HTTP",
+    ["route", "method"],
+    buckets=HTTP_LATENCY_BUCKETS,
+)
+
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_request_duration_seconds",
+    "Czas wywołania zależności zewnętrznej (Keycloak, MinIO, Elasticsearch)",
+    ["dependency", "operation"],
+    buckets=HTTP_LATENCY_BUCKETS,
+)
+
+DEPENDENCY_ERRORS = Counter(
+    "dependency_errors",
+    "Wywołania zależności zewnętrznych zakończone wyjątkiem",
+    ["dependency", "operation", "error"],
+)
+
+DEPENDENCY_IN_PROGRESS = Gauge(
+    "dependency_requests_in_progress",
+    "Liczba trwających wywołań zależności zewnętrznych",
+    ["dependency", "operation"],
+    multiprocess_mode="livesum",
+)
+
+EVENT_LOOP_BLOCKED = Counter(
+    "dependency_event_loop_blocked_seconds",
+    "Czas synchronicznych wywołań zależności wykonanych bezpośrednio w pętli zdarzeń",
+    ["dependency", "operation"],
+)
+
+
+def collect_metrics_registry():
+    """Rejestr do wystawienia w /metrics: zagregowany ze wszystkich workerów albo domyślny."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return None
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def cleanup_dead_workers() -> None:
+    """Usuwa pliki gauge "live" procesów, które już nie żyją.
+
+    Gunicorn robi to w haku child_exit (gunicorn.conf.py); uvicorn --workers
+    takiego haka nie ma, więc każdy startujący worker sprząta po poprzednikach.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return
+    pids = set()
+    for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "gauge_live*_*.db")):
+        pid = os.path.basename(path).rsplit("_", 1)[-1].removesuffix(".db")
+        if pid.isdigit():
+            pids.add(int(pid))
+    for pid in pids:
+        if pid != os.getpid() and not pid_alive(pid):
+            multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
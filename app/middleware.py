@@ -0,0 +1,99 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db_metrics import (
+    SQL_SERVER_TIMING,
+    QueryStats,
+    current_query_stats,
+    server_timing,
+    warn_repeated,
+)
+from app.metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_RESPONSE_SIZE,
+)
+
+# Jedna etykieta dla wszystkich ścieżek spoza routingu (404), żeby skany
+# losowych URL nie mnożyły serii
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope: Scope) -> str:
+    # Router FastAPI zapisuje dopasowaną trasę (również przy 405) w scope;
+    # czytane po obsłudze żądania, tak samo w obu middleware
+    return getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """Czas, liczba równoległych żądań i rozmiar odpowiedzi per szablon ścieżki."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        # Trasa nie jest jeszcze znana przed routingiem - tylko metoda
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            HTTP_REQUEST_DURATION.labels(route, method, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+            HTTP_RESPONSE_SIZE.labels(route, method).observe(size)
+            in_progress.dec()
+
+
+class QueryStatsMiddleware:
+    """Liczba i czas zapytań SQL per żądanie, opcjonalnie w nagłówku Server-Timing."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_wrapper(message: Message):
+            if SQL_SERVER_TIMING and message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", server_timing(stats)),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            route = route_template(scope)
+            method = scope["method"]
+            DB_QUERIES_PER_REQUEST.labels(route, method).observe(stats.count)
+            DB_TIME_PER_REQUEST.labels(route, method).observe(stats.duration)
+            warn_repeated(stats, method, route)
@@ -1,16 +1,38 @@
+import asyncio
 import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, UploadFile, status
 from minio import Minio
+from minio.datatypes import PostPolicy
+from minio.error import S3Error
+from pydantic import BaseModel
+
+from app.instrumentation import ClientSideError, instrument
 
 MINIO_ENDPOINT = os.getenv("MINIO_HOST", "minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minio_access_key")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minio_secret_key")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "user-media")
 
-minio_client = Minio(
-    MINIO_ENDPOINT,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=False,
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", str(10 * 1024 * 1024)))
+MAX_VIDEO_SIZE = int(os.getenv("MAX_VIDEO_SIZE", str(500 * 1024 * 1024)))
+# Adres MinIO widziany przez klientów (przeglądarka, aplikacja mobilna)
+MINIO_PUBLIC_URL = os.getenv("MINIO_PUBLIC_URL", "http://localhost:9000").rstrip("/")
+PRESIGNED_UPLOAD_EXPIRES = int(os.getenv("PRESIGNED_UPLOAD_EXPIRES", "900"))
+# MinIO wymaga części multipart o rozmiarze co najmniej 5 MiB
+UPLOAD_PART_SIZE = max(
+    int(os.getenv("UPLOAD_PART_SIZE", str(10 * 1024 * 1024))), 5 * 1024 * 1024
+)
+
+minio_client = instrument(
+    Minio(
+        MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=False,
+    ),
+    "minio",
 )
 
 
@@ -18,6 +40,203 @@ def get_minio_client():
     return minio_client
 
 
+def set_minio_client(client) -> None:
+    """Podmienia klienta MinIO (np. na atrapę w benchmarkach)."""
+    global minio_client
+    minio_client = instrument(client, "minio")
+
+
 def init_minio_bucket():
-    if not minio_client.bucket_exists(MINIO_BUCKET):
-        minio_client.make_bucket(MINIO_BUCKET)
+    client = get_minio_client()
+    if not client.bucket_exists(MINIO_BUCKET):
+        client.make_bucket(MINIO_BUCKET)
+
+
+QUICKTIME_ATOMS = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+
+def matches_signature(ext: str, header: bytes) -> bool:
+    if ext in (".jpg", ".jpeg"):
+        return header.startswith(b"\xff\xd8\xff")
+    if ext == ".png":
+        return header.startswith(b"\x89PNG\r\n\x1a\n")
+    if ext == ".mp4":
+        return header[4:8] == b"ftyp"
+    if ext == ".mov":
+        return header[4:8] in QUICKTIME_ATOMS
+    if ext == ".avi":
+        return header[:4] == b"RIFF" and header[8:12] == b"AVI "
+    return False
+
+
+class UploadTooLarge(ClientSideError):
+    pass
+
+
+class LimitedReader:
+    """Czyta strumień kawałkami i przerywa, gdy plik przekroczy limit."""
+
+    def __init__(self, stream, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.read_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.max_size:
+            raise UploadTooLarge()
+        return chunk
+
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Plik jest za duży (maksymalnie {max_size} bajtów)",
+    )
+
+
+async def upload_file(
+    minio_client, file: UploadFile, object_name: str, ext: str, max_size: int
+):
+    """Strumieniuje plik do MinIO w częściach multipart, poza pętlą zdarzeń."""
+    if file.size is not None and file.size > max_size:
+        raise too_large(max_size)
+
+    header = await file.read(16)
+    if not matches_signature(ext, header):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Zawartość pliku nie odpowiada formatowi: {ext}",
+        )
+    await file.seek(0)
+
+    try:
+        await asyncio.to_thread(
+            minio_client.put_object,
+            MINIO_BUCKET,
+            object_name,
+            LimitedReader(file.file, max_size),
+            length=-1,
+            part_size=UPLOAD_PART_SIZE,
+            content_type=file.content_type or "application/octet-stream",
+        )
+    except UploadTooLarge as e:
+        raise too_large(max_size) from e
+
+
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+}
+
+
+class PresignedUploadIn(BaseModel):
+    filename: str
+
+
+class PresignedUploadOut(BaseModel):
+    url: str
+    fields: dict[str, str]
+    object_name: str
+    max_size: int
+    expires_in: int
+
+
+class UploadConfirmIn(BaseModel):
+    object_name: str
+
+
+def media_url(object_name: str) -> str:
+    return f"{MINIO_PUBLIC_URL}/{MINIO_BUCKET}/{object_name}"
+
+
+def upload_extension(filename: str, allowed_extensions) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Niedozwolony format pliku: {ext}",
+        )
+    return ext
+
+
+async def presigned_upload(
+    minio_client, owner_id: str, ext: str, max_size: int
+) -> PresignedUploadOut:
+    """Polityka POST pozwalająca wgrać jeden plik bezpośrednio do MinIO.
+
+    Klucz obiektu, typ treści i maksymalny rozmiar są częścią podpisanej
+    polityki, więc MinIO odrzuci każdy inny upload.
+    """
+    object_name = f"{owner_id}/{uuid.uuid4()}{ext}"
+    content_type = CONTENT_TYPES[ext]
+
+    policy = PostPolicy(
+        MINIO_BUCKET,
+        datetime.now(timezone.utc) + timedelta(seconds=PRESIGNED_UPLOAD_EXPIRES),
+    )
+    policy.add_equals_condition("key", object_name)
+    policy.add_equals_condition("Content-Type", content_type)
+    policy.add_content_length_range_condition(1, max_size)
+    form_data = await asyncio.to_thread(minio_client.presigned_post_policy, policy)
+
+    return PresignedUploadOut(
+        url=f"{MINIO_PUBLIC_URL}/{MINIO_BUCKET}",
+        fields={**form_data, "key": object_name, "Content-Type": content_type},
+        object_name=object_name,
+        max_size=max_size,
+        expires_in=PRESIGNED_UPLOAD_EXPIRES,
+    )
+
+
+def read_object_header(minio_client, object_name: str) -> bytes:
+    response = minio_client.get_object(MINIO_BUCKET, object_name, offset=0, length=16)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def verify_upload(
+    minio_client, owner_id: str, object_name: str, allowed_extensions, max_size: int
+) -> str:
+    """Sprawdza obiekt wgrany przez klienta; zwraca jego rozszerzenie."""
+    if not object_name.startswith(f"{owner_id}/") or ".." in object_name:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Obiekt nie należy do użytkownika"
+        )
+    ext = upload_extension(object_name, allowed_extensions)
+
+    try:
+        stat = await asyncio.to_thread(
+            minio_client.stat_object, MINIO_BUCKET, object_name
+        )
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Plik nie został wgrany"
+            ) from e
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Błąd podczas weryfikacji pliku w MinIO",
+        ) from e
+
+    if stat.size > max_size:
+        await asyncio.to_thread(minio_client.remove_object, MINIO_BUCKET, object_name)
+        raise too_large(max_size)
+
+    # Polityka ogranicza nagłówek Content-Type, ale nie samą zawartość
+    header = await asyncio.to_thread(read_object_header, minio_client, object_name)
+    if stat.content_type != CONTENT_TYPES[ext] or not matches_signature(ext, header):
+        await asyncio.to_thread(minio_client.remove_object, MINIO_BUCKET, object_name)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Zawartość pliku nie odpowiada formatowi: {ext}",
+        )
+    return ext
@@ -1,7 +1,8 @@
 import enum
 import uuid
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import ARRAY, Column, Date, DateTime, Enum, Float, ForeignKey, Integer, Numeric, String, Table, Text, func
+from sqlalchemy import ARRAY, BigInteger, Column, Date, DateTime, Enum, Float, ForeignKey, Index, Integer, Numeric, String, Table, Text, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 
@@ -14,17 +15,24 @@ profile_specialization = Table(
     Column(
         "specialization_id", String, ForeignKey("specializations.id"), primary_key=True
     ),
+    # Klucz główny (profile_id, specialization_id) nie obsługuje wyszukiwania po specjalizacji
+    Index("ix_profile_specialization_specialization_id", "specialization_id"),
 )
 
 
 class Profile(Base):
     __tablename__ = "profiles"
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     description = Column(String)
     about_me = Column(String)
     location = Column(String)
     picture = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    # UPDATE ... WHERE version = :wczytana; równoległy zapis kończy się StaleDataError
+    __mapper_args__ = {"version_id_col": version}
 
     specializations = relationship(
         "Specialization", secondary=profile_specialization, back_populates="profiles"
@@ -45,8 +53,8 @@ class Profile(Base):
 class SocialLink(Base):
     __tablename__ = "social_links"
 
-    id = Column(Integer, primary_key=True, index=True)
-    profile_id = Column(String, ForeignKey("profiles.id"), nullable=False)
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(String, ForeignKey("profiles.id"), nullable=False, index=True)
     platform = Column(String, nullable=False)
     url = Column(String, nullable=False)
 
@@ -56,7 +64,7 @@ class SocialLink(Base):
 class Specialization(Base):
     __tablename__ = "specializations"
 
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     title = Column(String, nullable=False)
     short_description = Column(String)
 
@@ -65,6 +73,15 @@ class Specialization(Base):
     )
 
 
+class CatalogueVersion(Base):
+    """Licznik wersji danych słownikowych trzymanych w pamięci workerów."""
+
+    __tablename__ = "catalogue_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, server_default="1")
+
+
 class MediaType(enum.Enum):
     image = "image"
     video = "video"
@@ -72,12 +89,16 @@ class MediaType(enum.Enum):
 
 class Service(Base):
     __tablename__ = "services"
+    __table_args__ = (Index("ix_services_profile_id_id", "profile_id", "id"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
     description = Column(String)
     price = Column(Numeric, nullable=False)
     times = Column(ARRAY(Integer))
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    __mapper_args__ = {"version_id_col": version}
 
     profile_id = Column(String, ForeignKey("profiles.id"), nullable=False)
     profile = relationship("Profile", back_populates="services")
@@ -91,7 +112,7 @@ class ServiceMedia(Base):
     __tablename__ = "service_media"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    service_id = Column(String, ForeignKey("services.id"), nullable=False)
+    service_id = Column(String, ForeignKey("services.id"), nullable=False, index=True)
     media_type = Column(Enum(MediaType), nullable=False)
     media_url = Column(String, nullable=False)
 
@@ -100,8 +121,9 @@ class ServiceMedia(Base):
 
 class Pet(Base):
     __tablename__ = "pets"
+    __table_args__ = (Index("ix_pets_owner_id_id", "owner_id", "id"),)
 
-    id = Column(String, primary_key=True, index=True, default=func.uuid_generate_v4())
+    id = Column(String, primary_key=True, default=func.uuid_generate_v4())
     name = Column(String, nullable=False)
     species = Column(String, nullable=False)
     breed = Column(String, nullable=True)
@@ -112,6 +134,28 @@ class Pet(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
 
     owner = relationship("Profile", back_populates="pets")
- 
\ No newline at end of file
+
+
+class ProfileView(Base):
+    """Zdenormalizowany, gotowy do zwrócenia widok profilu (ProfileData)."""
+
+    __tablename__ = "profile_views"
+
+    profile_id = Column(String, ForeignKey("profiles.id"), primary_key=True)
+    version = Column(Integer, nullable=False)
+    data = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class SearchOutbox(Base):
+    """Zmiany profili czekające na wysłanie do Elasticsearch."""
+
+    __tablename__ = "search_outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    profile_id = Column(String, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
@@ -0,0 +1,52 @@
+import base64
+import json
+import os
+from typing import Any
+
+from fastapi import HTTPException, Query, status
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# Kursor następnej strony zwracamy w nagłówku, żeby nie zmieniać kształtu odpowiedzi
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_limit(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+) -> int:
+    return limit
+
+
+def encode_cursor(data: Any) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Nieprawidłowy kursor"
+        ) from e
+
+
+def keyset_page(query, column, cursor: str | None, limit: int):
+    """Dokłada do zapytania warunek kursora, sortowanie i limit (+1 do wykrycia kolejnej strony)."""
+    if cursor:
+        last_key = decode_cursor(cursor)
+        if not isinstance(last_key, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Nieprawidłowy kursor"
+            )
+        query = query.where(column > last_key)
+    return query.order_by(column).limit(limit + 1)
+
+
+def next_page(rows: list, limit: int, key) -> tuple[list, str | None]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
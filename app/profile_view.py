@@ -0,0 +1,303 @@
+"""Zdenormalizowany widok profilu: dane z bazy i z Keycloak w jednym wierszu JSONB.
+
+Odczyt profilu to jedno zapytanie po kluczu głównym. Każdy zapis zmieniający
+dane profilu (pola, specjalizacje, linki, zdjęcie, dane Keycloak) wywołuje
+sync_profile_view w swojej transakcji. Dane z Keycloak zapis pobiera wcześniej
+(fetch_user_data), żeby nie trzymać blokady wiersza i połączenia z puli na czas
+wywołań HTTP. Brakujące widoki (np. nowych profili) uzupełnia odczyt w osobnej
+transakcji albo backfill:
+
+    python -m app.profile_view --batch-size 500
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.db import close_db, get_sessionmaker
+from app.keycloak_api import get_keycloak_user
+from app.models import Profile, ProfileView, profile_specialization
+
+logger = logging.getLogger("profile_view")
+
+
+def profile_data(
+    profile: Profile,
+    user_data: dict | None,
+    specialization_ids: list[str] | None = None,
+    social_links: list | None = None,
+) -> dict:
+    """Kształt ProfileData; relacje można podać jawnie, jeśli nie są załadowane."""
+    user_data = user_data or {}
+    if specialization_ids is None:
+        specialization_ids = [spec.id for spec in profile.specializations]
+    if social_links is None:
+        social_links = profile.social_links
+    return {
+        "id": profile.id,
+        "username": user_data.get("username"),
+        "email": user_data.get("email"),
+        "firstName": user_data.get("firstName"),
+        "lastName": user_data.get("lastName"),
+        "picture": profile.picture,
+        "description": profile.description,
+        "about_me": profile.about_me,
+        "location": profile.location,
+        "specializations": list(specialization_ids),
+        "social_links": [
+            {"id": link.id, "platform": link.platform, "url": link.url}
+            for link in social_links
+        ],
+    }
+
+
+async def load_profiles(db: AsyncSession, profile_ids: list[str]) -> list[Profile]:
+    result = await db.execute(
+        select(Profile)
+        .options(
+            selectinload(Profile.specializations), selectinload(Profile.social_links)
+        )
+        .where(Profile.id.in_(profile_ids))
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+async def fetch_user_data(profile_id: str) -> dict | None:
+    """Dane z Keycloak pobierane przed transakcją zapisu; None, jeśli niedostępne."""
+    try:
+        return await get_keycloak_user(profile_id)
+    except Exception:
+        logger.warning("Brak danych użytkownika %s z Keycloak", profile_id)
+        return None
+
+
+async def fetch_users_data(profiles: list[Profile]) -> list:
+    return await asyncio.gather(
+        *(get_keycloak_user(profile.id) for profile in profiles),
+        return_exceptions=True,
+    )
+
+
+def compose_views(profiles: list[Profile], users_data: list):
+    """(widoki, wiersze do zapisu, profile bez danych z Keycloak).
+
+    Widok bez danych z Keycloak ma wersję None - ta sama wersja profilu po
+    powrocie Keycloak dałaby pełną odpowiedź z tym samym ETagiem.
+    """
+    views = {}
+    rows = []
+    stale = []
+    for profile, user_data in zip(profiles, users_data):
+        if user_data is None or isinstance(user_data, Exception):
+            # Bez danych z Keycloak nie utrwalamy widoku - zbudujemy go przy odczycie
+            stale.append(profile.id)
+            views[profile.id] = (None, profile_data(profile, None))
+            continue
+        data = profile_data(profile, user_data)
+        views[profile.id] = (profile.version, data)
+        rows.append({"profile_id": profile.id, "version": profile.version, "data": data})
+    return views, rows, stale
+
+
+async def build_profile_views(
+    db: AsyncSession, users_data: dict[str, dict | None]
+) -> dict[str, tuple[int | None, dict]]:
+    """Składa widoki od nowa w bieżącej transakcji zapisu (hooki zapisów).
+
+    Dane z Keycloak (id profilu -> dane albo None) podaje wywołujący - w
+    transakcji zapisu nie wykonujemy żadnych wywołań zdalnych.
+    """
+    await db.flush()
+    profiles = await load_profiles(db, list(users_data))
+    if not profiles:
+        return {}
+
+    views, rows, stale = compose_views(
+        profiles, [users_data[profile.id] for profile in profiles]
+    )
+    await write_profile_views(db, rows, stale)
+    return views
+
+
+async def build_missing_views(
+    db: AsyncSession, profile_ids: list[str]
+) -> dict[str, tuple[int | None, dict]]:
+    """Buduje widoki poza transakcją zapisu danych profilu.
+
+    Transakcja odczytu kończy się przed wywołaniami Keycloak, a widoki są
+    zapisywane w osobnej, krótkiej transakcji. Starszy odczyt nie nadpisze
+    nowszego widoku dzięki warunkowi na wersję w write_profile_views.
+    """
+    profiles = await load_profiles(db, profile_ids)
+    await db.commit()
+    if not profiles:
+        return {}
+
+    views, rows, stale = compose_views(profiles, await fetch_users_data(profiles))
+    if rows or stale:
+        await write_profile_views(db, rows, stale)
+        await db.commit()
+    return views
+
+
+async def write_profile_views(
+    db: AsyncSession, rows: list[dict], stale: list[str] = ()
+) -> None:
+    if rows:
+        stmt = insert(ProfileView).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ProfileView.profile_id],
+                set_={
+                    "version": stmt.excluded.version,
+                    "data": stmt.excluded.data,
+                    "updated_at": func.now(),
+                },
+                where=ProfileView.version <= stmt.excluded.version,
+            )
+        )
+    if stale:
+        await db.execute(delete(ProfileView).where(ProfileView.profile_id.in_(stale)))
+
+
+async def save_profile_view(
+    db: AsyncSession,
+    profile: Profile,
+    user_data: dict | None,
+    specialization_ids: list[str],
+    social_links: list,
+) -> tuple[int | None, dict]:
+    """Zapisuje widok z danych, które wywołujący już ma - bez ponownego ładowania profilu.
+
+    Zwraca wersję None, jeśli brakuje danych z Keycloak (odpowiedź niepełna).
+    """
+    data = profile_data(profile, user_data, specialization_ids, social_links)
+    if user_data is None:
+        await write_profile_views(db, [], [profile.id])
+        return None, data
+    await write_profile_views(
+        db, [{"profile_id": profile.id, "version": profile.version, "data": data}]
+    )
+    return profile.version, data
+
+
+async def sync_profile_view(
+    db: AsyncSession, profile_id: str, user_data: dict | None
+) -> tuple[int | None, dict] | None:
+    return (await build_profile_views(db, {profile_id: user_data})).get(profile_id)
+
+
+async def load_profile_views(
+    db: AsyncSession, profile_ids: list[str]
+) -> dict[str, tuple[int | None, dict]]:
+    """Widoki (wersja, dane) dla podanych profili; brakujące buduje na miejscu."""
+    result = await db.execute(
+        select(ProfileView.profile_id, ProfileView.version, ProfileView.data).where(
+            ProfileView.profile_id.in_(profile_ids)
+        )
+    )
+    views = {row.profile_id: (row.version, row.data) for row in result}
+
+    missing = [profile_id for profile_id in profile_ids if profile_id not in views]
+    if missing:
+        # Zwykle tylko nowe profile - resztę uzupełnia backfill_profile_views
+        views.update(await build_missing_views(db, missing))
+    return views
+
+
+async def load_profile_view(
+    db: AsyncSession, profile_id: str
+) -> tuple[int | None, dict] | None:
+    return (await load_profile_views(db, [profile_id])).get(profile_id)
+
+
+async def drop_specialization_from_views(
+    db: AsyncSession, specialization_id: str
+) -> list[str]:
+    """Usuwa specjalizację z widoków profili, które ją mają; zwraca ich id.
+
+    Dane z Keycloak w widoku się nie zmieniają, więc poprawiamy zapisany JSON
+    zamiast budować widoki od nowa. Wywoływać przed usunięciem powiązań.
+    """
+    result = await db.execute(
+        select(profile_specialization.c.profile_id).where(
+            profile_specialization.c.specialization_id == specialization_id
+        )
+    )
+    profile_ids = list(result.scalars())
+    if not profile_ids:
+        return []
+
+    result = await db.execute(
+        update(Profile)
+        .where(Profile.id.in_(profile_ids))
+        .values(version=Profile.version + 1)
+        .returning(Profile.id, Profile.version)
+        .execution_options(synchronize_session=False)
+    )
+    versions = dict(result.tuples().all())
+
+    result = await db.execute(
+        select(ProfileView.profile_id, ProfileView.data).where(
+            ProfileView.profile_id.in_(profile_ids)
+        )
+    )
+    rows = [
+        {
+            "profile_id": row.profile_id,
+            "version": versions[row.profile_id],
+            "data": {
+                **row.data,
+                "specializations": [
+                    spec_id
+                    for spec_id in row.data.get("specializations", [])
+                    if spec_id != specialization_id
+                ],
+            },
+        }
+        for row in result
+    ]
+    await write_profile_views(db, rows)
+    return profile_ids
+
+
+async def backfill_profile_views(batch_size: int = 500) -> int:
+    """Buduje brakujące widoki partiami, poza ścieżką żądań."""
+    built = 0
+    last_id = ""
+    async with get_sessionmaker()() as session:
+        while True:
+            result = await session.execute(
+                select(Profile.id)
+                .outerjoin(ProfileView, ProfileView.profile_id == Profile.id)
+                .where(ProfileView.profile_id.is_(None), Profile.id > last_id)
+                .order_by(Profile.id)
+                .limit(batch_size)
+            )
+            profile_ids = list(result.scalars())
+            if not profile_ids:
+                return built
+            last_id = profile_ids[-1]
+            built += len(await build_missing_views(session, profile_ids))
+            session.expunge_all()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Uzupełnia brakujące widoki profili")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    try:
+        built = await backfill_profile_views(args.batch_size)
+        logger.info("Zbudowano %d widoków profili", built)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Response, status
+
+from app import health
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    # Proces żyje i pętla zdarzeń odpowiada - zależności nie mają tu znaczenia
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(response: Response):
+    if health.dependencies is None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "starting", "dependencies": {}}
+
+    ready, report = await health.dependencies.readiness()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "not_ready", "dependencies": report}
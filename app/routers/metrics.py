@@ -1,9 +1,12 @@
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, REGISTRY
 from fastapi import APIRouter, Response
 
+from app.metrics import collect_metrics_registry
+
 router = APIRouter()
 
 
 @router.get("/metrics")
 async def metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = collect_metrics_registry() or REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
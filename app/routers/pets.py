@@ -1,13 +1,22 @@
 import uuid
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import date, datetime
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Query, status, Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status, Response
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.models import Pet
+from app.conditional import (
+    check_if_match,
+    commit_versioned,
+    etag_matches,
+    not_modified,
+    version_etag,
+)
 from app.db import get_db
+from app.pagination import NEXT_CURSOR_HEADER, keyset_page, next_page, page_limit
+from app.serialization import list_adapter, list_response
 from app.auth import get_current_user  # Funkcja zależności zwracająca dane aktualnego użytkownika
 
 router = APIRouter(prefix="/api/users")
@@ -35,10 +44,11 @@ class PetOut(PetBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
+PET_LIST = list_adapter(PetOut)
+
 
 
 # Endpoint tworzenia pupila
@@ -68,6 +78,8 @@ async def create_pet(
 @router.get("/pets/{pet_id}", response_model=PetOut)
 async def get_pet(
     pet_id: str,
+    request: Request,
+    response: Response,
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -77,12 +89,19 @@ async def get_pet(
     pet = result.scalars().first()
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
+    etag = version_etag(pet.version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return pet
 
 # Endpoint pobierania listy pupili dla aktualnie zalogowanego właściciela
 @router.get("/pets/", response_model=List[PetOut])
 async def list_pets(
+    response: Response,
     user_id=Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Depends(page_limit),
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -92,15 +111,19 @@ async def list_pets(
     else:
         q = q.where(Pet.owner_id == current_user[0]["sub"])
 
-    result = await db.execute(q)
-    pets = result.scalars().all()
-    return pets
+    result = await db.execute(keyset_page(q, Pet.id, cursor, limit))
+    pets, next_cursor = next_page(result.scalars().all(), limit, lambda pet: pet.id)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return list_response(PET_LIST, pets, response)
 
 # Endpoint częściowej aktualizacji (PATCH) danych pupila
 @router.patch("/pets/{pet_id}", response_model=PetOut)
 async def update_pet(
     pet_id: str,
     pet_update: PetUpdate,
+    request: Request,
+    response: Response,
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -110,7 +133,8 @@ async def update_pet(
     pet = result.scalars().first()
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
-    
+    check_if_match(request.headers.get("if-match"), version_etag(pet.version))
+
     # Aktualizujemy tylko przesłane pola
     if pet_update.name is not None:
         pet.name = pet_update.name
@@ -127,8 +151,9 @@ async def update_pet(
     if pet_update.description is not None:
         pet.description = pet_update.description
 
-    await db.commit()
+    await commit_versioned(db)
     await db.refresh(pet)
+    response.headers["ETag"] = version_etag(pet.version)
     return pet
 
 # Endpoint usuwania pupila
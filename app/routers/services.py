@@ -1,16 +1,35 @@
-from io import BytesIO
-import os
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 import uuid
-from fastapi import APIRouter, File, HTTPException, Depends, Query, UploadFile, status
+from fastapi import APIRouter, File, HTTPException, Depends, Query, Request, Response, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.auth import get_current_user
-from app.minio import MINIO_BUCKET, get_minio_client
+from app.conditional import (
+    check_if_match,
+    commit_versioned,
+    etag_matches,
+    not_modified,
+    version_etag,
+)
+from app.minio import (
+    MAX_IMAGE_SIZE,
+    MAX_VIDEO_SIZE,
+    PresignedUploadIn,
+    PresignedUploadOut,
+    UploadConfirmIn,
+    get_minio_client,
+    media_url,
+    presigned_upload,
+    upload_extension,
+    upload_file,
+    verify_upload,
+)
 from app.models import MediaType, Service, ServiceMedia
+from app.pagination import NEXT_CURSOR_HEADER, keyset_page, next_page, page_limit
+from app.serialization import list_adapter, list_response
 from app.db import get_db
 from minio.error import S3Error
 
@@ -37,10 +56,11 @@ class ServiceResponse(ServiceBase):
     id: str
     profile_id: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
+SERVICE_LIST = list_adapter(ServiceResponse)
+
 router = APIRouter(prefix="/api/services", tags=["services"])
 
 
@@ -68,7 +88,10 @@ async def create_service(
 
 @router.get("/", response_model=List[ServiceResponse])
 async def get_all_services(
+    response: Response,
     user_id=Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Depends(page_limit),
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -76,29 +99,55 @@ async def get_all_services(
     if user_id:
         q = q.where(Service.profile_id == user_id)
 
-    result = await db.execute(q)
-    services = result.scalars().all()
-    return services
+    result = await db.execute(keyset_page(q, Service.id, cursor, limit))
+    services, next_cursor = next_page(
+        result.scalars().all(), limit, lambda service: service.id
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return list_response(SERVICE_LIST, services, response)
 
 @router.get("/user/{profile_id}", response_model=List[ServiceResponse])
 async def get_services_for_user(
     profile_id: str,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Depends(page_limit),
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(select(Service).where(Service.profile_id == profile_id))
-    services = result.scalars().all()
-    return services
+    result = await db.execute(
+        keyset_page(
+            select(Service).where(Service.profile_id == profile_id),
+            Service.id,
+            cursor,
+            limit,
+        )
+    )
+    services, next_cursor = next_page(
+        result.scalars().all(), limit, lambda service: service.id
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return list_response(SERVICE_LIST, services, response)
 
 
 @router.get("/{service_id}", response_model=ServiceResponse)
 async def get_service(
-    service_id: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    service_id: str,
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     result = await db.execute(select(Service).where(Service.id == service_id))
     service = result.scalar_one_or_none()
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
+    etag = version_etag(service.version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return service
 
 
@@ -106,6 +155,8 @@ async def get_service(
 async def update_service(
     service_id: str,
     service_in: ServiceUpdate,
+    request: Request,
+    response: Response,
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -117,6 +168,7 @@ async def update_service(
     service = result.scalar_one_or_none()
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
+    check_if_match(request.headers.get("if-match"), version_etag(service.version))
 
     if service_in.name is not None:
         service.name = service_in.name
@@ -127,8 +179,9 @@ async def update_service(
     if service_in.times is not None:
         service.times = service_in.times
 
-    await db.commit()
+    await commit_versioned(db)
     await db.refresh(service)
+    response.headers["ETag"] = version_etag(service.version)
     return service
 
 
@@ -151,6 +204,13 @@ async def delete_service(
 
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
 ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov"}
+ALLOWED_MEDIA_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS | ALLOWED_VIDEO_EXTENSIONS
+
+
+def media_limits(ext: str) -> tuple[MediaType, int]:
+    if ext in ALLOWED_VIDEO_EXTENSIONS:
+        return MediaType.video, MAX_VIDEO_SIZE
+    return MediaType.image, MAX_IMAGE_SIZE
 
 
 @router.post("/api/services/{service_id}/media", status_code=status.HTTP_201_CREATED)
@@ -170,45 +230,95 @@ async def upload_service_media(
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    ext = os.path.splitext(file.filename or "")[1].lower()
-    if ext in ALLOWED_IMAGE_EXTENSIONS:
-        media_type = MediaType.image
-    elif ext in ALLOWED_VIDEO_EXTENSIONS:
-        media_type = MediaType.video
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Niedozwolony format pliku: {ext}",
-        )
+    ext = upload_extension(file.filename, ALLOWED_MEDIA_EXTENSIONS)
+    media_type, max_size = media_limits(ext)
 
     unique_filename = f"{uuid.uuid4()}{ext}"
     try:
-        file_data = await file.read()
-        file_size = len(file_data)
-        file_stream = BytesIO(file_data)
-        minio_client.put_object(
-            MINIO_BUCKET,
-            unique_filename,
-            file_stream,
-            file_size,
-            content_type=file.content_type,
-        )
+        await upload_file(minio_client, file, unique_filename, ext, max_size)
     except S3Error as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Błąd podczas uploadu do MinIO",
         ) from e
 
-    media_url = f"http://localhost:9000/{MINIO_BUCKET}/{unique_filename}"
+    url = media_url(unique_filename)
 
     new_media = ServiceMedia(
         id=str(uuid.uuid4()),
         service_id=service_id,
         media_type=media_type,
-        media_url=media_url,
+        media_url=url,
     )
     db.add(new_media)
     await db.commit()
     await db.refresh(new_media)
 
-    return {"url": media_url, "media_type": media_type.value, "id": new_media.id}
+    return {"url": url, "media_type": media_type.value, "id": new_media.id}
+
+
+async def get_own_service(db: AsyncSession, service_id: str, profile_id: str) -> Service:
+    result = await db.execute(
+        select(Service).where(Service.id == service_id, Service.profile_id == profile_id)
+    )
+    service = result.scalar_one_or_none()
+    if not service:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return service
+
+
+# Dwuetapowy upload: klient wysyła plik prosto do MinIO, API tylko go weryfikuje
+@router.post("/{service_id}/media/presigned", response_model=PresignedUploadOut)
+async def presign_service_media(
+    service_id: str,
+    upload: PresignedUploadIn,
+    db: AsyncSession = Depends(get_db),
+    minio_client=Depends(get_minio_client),
+    current_user=Depends(get_current_user),
+):
+    owner_id = current_user[0]["sub"]
+    await get_own_service(db, service_id, owner_id)
+    ext = upload_extension(upload.filename, ALLOWED_MEDIA_EXTENSIONS)
+    _, max_size = media_limits(ext)
+    return await presigned_upload(minio_client, owner_id, ext, max_size)
+
+
+@router.post("/{service_id}/media/confirm", status_code=status.HTTP_201_CREATED)
+async def confirm_service_media(
+    service_id: str,
+    upload: UploadConfirmIn,
+    db: AsyncSession = Depends(get_db),
+    minio_client=Depends(get_minio_client),
+    current_user=Depends(get_current_user),
+):
+    owner_id = current_user[0]["sub"]
+    await get_own_service(db, service_id, owner_id)
+    ext = upload_extension(upload.object_name, ALLOWED_MEDIA_EXTENSIONS)
+    media_type, max_size = media_limits(ext)
+    await verify_upload(
+        minio_client,
+        owner_id,
+        upload.object_name,
+        ALLOWED_MEDIA_EXTENSIONS,
+        max_size,
+    )
+
+    url = media_url(upload.object_name)
+    # Ponowne potwierdzenie tego samego obiektu nie tworzy duplikatu
+    result = await db.execute(
+        select(ServiceMedia).where(
+            ServiceMedia.service_id == service_id, ServiceMedia.media_url == url
+        )
+    )
+    media = result.scalar_one_or_none()
+    if media is None:
+        media = ServiceMedia(
+            id=str(uuid.uuid4()),
+            service_id=service_id,
+            media_type=media_type,
+            media_url=url,
+        )
+        db.add(media)
+        await db.commit()
+
+    return {"url": url, "media_type": media.media_type.value, "id": media.id}
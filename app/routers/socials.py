@@ -1,10 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.auth import get_current_user
+from app.conditional import touch_profile
 from app.db import get_db
 from app.models import Profile, SocialLink
+from app.profile_view import fetch_user_data, sync_profile_view
 
 
 class SocialLinkBase(BaseModel):
@@ -23,8 +25,7 @@ class SocialLinkUpdate(SocialLinkBase):
 class SocialLinkOut(SocialLinkBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 router = APIRouter()
@@ -36,7 +37,10 @@ router = APIRouter()
 async def get_social_links(
     user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
 ):
-    return user[1].social_links
+    result = await db.execute(
+        select(SocialLink).where(SocialLink.profile_id == user[0]["sub"])
+    )
+    return result.scalars().all()
 
 
 @router.post(
@@ -49,10 +53,14 @@ async def add_social_link(
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    # Keycloak przed transakcją - nie trzymamy blokady profilu na czas HTTP
+    user_data = await fetch_user_data(user[0]["sub"])
     new_link = SocialLink(
         profile_id=user[0]["sub"], platform=social_link.platform, url=social_link.url
     )
     db.add(new_link)
+    await touch_profile(db, user[0]["sub"])
+    await sync_profile_view(db, user[0]["sub"], user_data)
     await db.commit()
     await db.refresh(new_link)
     return new_link
@@ -67,6 +75,7 @@ async def update_social_link(
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
+    user_data = await fetch_user_data(user[0]["sub"])
     result = await db.execute(
         select(SocialLink).where(
             SocialLink.id == link_id, SocialLink.profile_id == user[0]["sub"]
@@ -78,6 +87,8 @@ async def update_social_link(
 
     link.platform = social_link.platform
     link.url = social_link.url
+    await touch_profile(db, user[0]["sub"])
+    await sync_profile_view(db, user[0]["sub"], user_data)
 
     await db.commit()
     await db.refresh(link)
@@ -91,6 +102,7 @@ async def update_social_link(
 async def delete_social_link(
     link_id: int, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
 ):
+    user_data = await fetch_user_data(user[0]["sub"])
     result = await db.execute(
         select(SocialLink).where(
             SocialLink.id == link_id, SocialLink.profile_id == user[0]["sub"]
@@ -101,5 +113,7 @@ async def delete_social_link(
         raise HTTPException(status_code=404, detail="Social link not found")
 
     await db.delete(link)
+    await touch_profile(db, user[0]["sub"])
+    await sync_profile_view(db, user[0]["sub"], user_data)
     await db.commit()
     return {"detail": "Social link deleted"}
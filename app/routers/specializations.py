@@ -1,11 +1,18 @@
+import os
 from typing import List
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete
 from sqlalchemy.future import select
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from app.catalogue import bump_catalogue_version, specializations_catalogue
+from app.conditional import etag_matches
 from app.db import get_db
-from app.models import Specialization
+from app.models import SearchOutbox, Specialization, profile_specialization
+from app.profile_view import drop_specialization_from_views
+
+SPECIALIZATIONS_MAX_AGE = int(os.getenv("SPECIALIZATIONS_MAX_AGE", "300"))
 
 router = APIRouter()
 
@@ -25,15 +32,21 @@ class SpecializationResponse(BaseModel):
     title: str
     short_description: str | None = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 @router.get("/api/users/specializations", response_model=List[SpecializationResponse])
-async def get_specializations(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Specialization))
-    specializations = result.scalars().all()
-    return specializations
+async def get_specializations(request: Request, db: AsyncSession = Depends(get_db)):
+    catalogue = await specializations_catalogue.get(db)
+    headers = {
+        "ETag": catalogue.etag,
+        "Cache-Control": f"public, max-age={SPECIALIZATIONS_MAX_AGE}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), catalogue.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=catalogue.body, media_type="application/json", headers=headers
+    )
 
 
 @router.post("/api/users/specializations", response_model=SpecializationResponse)
@@ -46,7 +59,9 @@ async def create_specialization(
         short_description=specialization_in.short_description,
     )
     db.add(new_spec)
+    await bump_catalogue_version(db, specializations_catalogue.name)
     await db.commit()
+    specializations_catalogue.invalidate()
     await db.refresh(new_spec)
     return new_spec
 
@@ -69,7 +84,9 @@ async def update_specialization(
         spec.title = specialization_in.title
     if specialization_in.short_description is not None:
         spec.short_description = specialization_in.short_description
+    await bump_catalogue_version(db, specializations_catalogue.name)
     await db.commit()
+    specializations_catalogue.invalidate()
     await db.refresh(spec)
     return spec
 
@@ -82,6 +99,17 @@ async def delete_specialization(spec_id: str, db: AsyncSession = Depends(get_db)
     spec = result.scalar_one_or_none()
     if spec is None:
         raise HTTPException(status_code=404, detail="Specjalizacja nie znaleziona")
+
+    # Widoki i dokumenty ES profili z tą specjalizacją zmieniają się w tej samej transakcji
+    profile_ids = await drop_specialization_from_views(db, spec_id)
+    db.add_all(SearchOutbox(profile_id=profile_id) for profile_id in profile_ids)
+    await db.execute(
+        delete(profile_specialization).where(
+            profile_specialization.c.specialization_id == spec_id
+        )
+    )
     await db.delete(spec)
+    await bump_catalogue_version(db, specializations_catalogue.name)
     await db.commit()
+    specializations_catalogue.invalidate()
     return {"detail": "Specjalizacja usunięta pomyślnie"}
@@ -2,23 +2,64 @@ import os
 import uuid
 from typing import List, Optional
 
-from app.es.index import index_user
-from app.keycloak_api import keycloak_admin
-from sqlalchemy.orm import selectinload
+from app.es.index import USERS_ALIAS, users_query
+from app.keycloak_api import update_keycloak_user
 from app.auth import get_current_user
+from app.cache import TTLCache
+from app.conditional import (
+    check_if_match,
+    etag_matches,
+    not_modified,
+    set_version_etag,
+    version_etag,
+)
 from app.db import get_db
 from app.metrics import REQUEST_COUNT
-from app.minio import MINIO_BUCKET, get_minio_client
-from app.models import Profile, Specialization
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from pydantic import BaseModel
-from sqlalchemy import select
+from app.minio import (
+    MAX_IMAGE_SIZE,
+    PresignedUploadIn,
+    PresignedUploadOut,
+    UploadConfirmIn,
+    get_minio_client,
+    media_url,
+    presigned_upload,
+    upload_extension,
+    upload_file,
+    verify_upload,
+)
+from app.models import (
+    Profile,
+    SearchOutbox,
+    SocialLink,
+    Specialization,
+    profile_specialization,
+)
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_limit
+from app.profile_view import (
+    fetch_user_data,
+    load_profile_view,
+    load_profile_views,
+    save_profile_view,
+    sync_profile_view,
+)
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import delete, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.es.instance import get_es_instance
-from io import BytesIO
+from app.es.instance import get_es
+from elasticsearch import NotFoundError
 from minio.error import S3Error
 
 
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+SEARCH_PIT_KEEP_ALIVE = os.getenv("SEARCH_PIT_KEEP_ALIVE", "1m")
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+# Musi być krótszy niż SEARCH_PIT_KEEP_ALIVE - kursory z cache wskazują na PIT
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "10"))
+
+search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
 router = APIRouter()
 
 
@@ -27,8 +68,7 @@ class SocialLinkOut(BaseModel):
     platform: str
     url: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ProfileData(BaseModel):
@@ -55,6 +95,8 @@ class SearchHit(BaseModel):
     description: str
     type: str
     location: str
+    picture: str | None = None
+    specializations: list[str] = []
 
 class ProfilePatch(BaseModel):
     email: Optional[str] = None
@@ -67,114 +109,159 @@ class ProfilePatch(BaseModel):
     specializations: Optional[List[str]] = None
 
 
-@router.get("/api/users/users/current", response_model=ProfileData)
-async def get_current_user_data(
-    user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
-):
-    user, profile = user
+async def update_profile(
+    db: AsyncSession, profile_id: str, values: dict, if_match: str | None
+) -> Profile:
+    """UPDATE ... RETURNING zamiast SELECT + flush; wersję podbijamy w tym samym zapytaniu."""
     result = await db.execute(
-        select(Profile)
-        .options(
-            selectinload(Profile.specializations), selectinload(Profile.social_links)
+        update(Profile)
+        .where(Profile.id == profile_id)
+        .values(**values, version=Profile.version + 1)
+        .returning(Profile)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    profile = result.scalar()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Wiersz jest zablokowany do końca transakcji, więc poprzednia wersja to version - 1
+    check_if_match(if_match, version_etag(profile.version - 1))
+    return profile
+
+
+async def precheck_if_match(
+    db: AsyncSession, profile_id: str, if_match: str | None
+) -> None:
+    """If-Match sprawdzane przed zapisem w Keycloak - 412 nie może go pozostawić.
+
+    Wiążące jest sprawdzenie w update_profile pod blokadą wiersza; tu tylko
+    odczyt, a transakcja kończy się przed wywołaniami Keycloak.
+    """
+    if not if_match or if_match.strip() == "*":
+        return
+    version = await db.scalar(select(Profile.version).where(Profile.id == profile_id))
+    await db.commit()
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    check_if_match(if_match, version_etag(version))
+
+
+async def update_user_data(profile_id: str, payload: dict) -> dict | None:
+    """Zapisuje pola w Keycloak i zwraca dane do widoku bez dodatkowego odczytu."""
+    user_data = await fetch_user_data(profile_id)
+    await update_keycloak_user(profile_id, payload)
+    if user_data is None:
+        return None
+    changed = {key: value for key, value in payload.items() if value is not None}
+    return {**user_data, **changed}
+
+
+async def sync_specializations(
+    db: AsyncSession, profile_id: str, specialization_ids: list[str]
+) -> list[str]:
+    """Różnicowa aktualizacja profile_specialization.
+
+    Usuwa tylko zbędne powiązania i dodaje tylko brakujące - niezmienione wiersze
+    zostają nietknięte. Nieznane identyfikatory pomija baza w tym samym zapytaniu
+    (INSERT ... SELECT z tabeli specializations), bez polegania na katalogu
+    w pamięci, który może nie znać jeszcze usunięcia z innego workera.
+    """
+    requested = list(dict.fromkeys(specialization_ids))
+
+    await db.execute(
+        delete(profile_specialization).where(
+            profile_specialization.c.profile_id == profile_id,
+            profile_specialization.c.specialization_id.not_in(requested),
+        )
+    )
+    if not requested:
+        return []
+
+    known = select(Specialization.id).where(Specialization.id.in_(requested))
+    inserted = (
+        insert(profile_specialization)
+        .from_select(
+            ["profile_id", "specialization_id"],
+            select(literal(profile_id), Specialization.id).where(
+                Specialization.id.in_(requested)
+            ),
         )
-        .where(Profile.id == user["sub"])
+        .on_conflict_do_nothing()
+        .cte("inserted")
     )
-    user_profile = result.scalar()
+    # Zapytanie z CTE modyfikującym dane: wstawienie i lista istniejących id naraz
+    result = await db.execute(known.add_cte(inserted))
+    existing = set(result.scalars())
+    return [spec_id for spec_id in requested if spec_id in existing]
 
-    response = keycloak_admin.get_user(
-        user["sub"],
+
+@router.get("/api/users/users", response_model=list[ProfileData])
+async def get_users(
+    ids: list[str] = Query(...),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    # Obsługujemy zarówno ?ids=a&ids=b, jak i ?ids=a,b
+    user_ids = list(
+        dict.fromkeys(i for value in ids for i in value.split(",") if i)
     )
+    if len(user_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Maksymalnie {MAX_BATCH_IDS} identyfikatorów",
+        )
+    if not user_ids:
+        return []
 
-    user = response
+    views = await load_profile_views(db, user_ids)
+    return [views[user_id][1] for user_id in user_ids if user_id in views]
 
-    if not user_profile:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    return {
-        "id": user["id"],
-        "email": user["email"],
-        "firstName": user["firstName"],
-        "lastName": user["lastName"],
-        "username": user["username"],
-        "picture": user_profile.picture,
-        "description": user_profile.description,
-        "about_me": user_profile.about_me,
-        "location": user_profile.location,
-        "specializations": [spec.id for spec in user_profile.specializations],
-        "social_links": [
-            {"id": link.id, "platform": link.platform, "url": link.url}
-            for link in user_profile.social_links
-        ],
-    }
+@router.get("/api/users/users/current", response_model=ProfileData)
+async def get_current_user_data(
+    user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
+):
+    user, _ = user
+    view = await load_profile_view(db, user["sub"])
+    if view is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return view[1]
 
 
 @router.get("/api/users/users/{user_id}", response_model=ProfileData)
 async def get_user(
-    user_id: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    user_id: str,
+    request: Request,
+    response: Response,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(Profile)
-        .options(
-            selectinload(Profile.specializations), selectinload(Profile.social_links)
-        )
-        .where(Profile.id == user_id)
-    )
-    profile = result.scalar()
-
-    user_data = keycloak_admin.get_user(user_id)
-
-    if not profile:
+    # Jeden odczyt po kluczu głównym z gotowego widoku profilu
+    view = await load_profile_view(db, user_id)
+    if view is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return {
-        "id": profile.id,
-        "username": user_data["username"],
-        "email": user_data["email"],
-        "firstName": user_data["firstName"],
-        "lastName": user_data["lastName"],
-        "picture": profile.picture,
-        "description": profile.description,
-        "about_me": profile.about_me,
-        "location": profile.location,
-        "specializations": [spec.id for spec in profile.specializations],
-        "social_links": [
-            {"id": link.id, "platform": link.platform, "url": link.url}
-            for link in profile.social_links
-        ],
-    }
+    version, data = view
+    if version is not None and etag_matches(
+        request.headers.get("if-none-match"), version_etag(version)
+    ):
+        return not_modified(version_etag(version))
+    set_version_etag(response, version)
+    return data
 
 
 @router.put("/api/users/users/{user_id}", response_model=ProfileData)
 async def update_user(
     user_id: str,
     user_data: ProfileData,
+    request: Request,
+    response: Response,
     user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(
-        select(Profile)
-        .options(
-            selectinload(Profile.specializations), selectinload(Profile.social_links)
-        )
-        .where(Profile.id == user_id)
-    )
-    profile = result.scalar()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    result = await db.execute(
-        select(Specialization).where(Specialization.id.in_(user_data.specializations))
-    )
-    specializations = result.scalars().all()
-    profile.about_me = user_data.about_me
-    profile.description = user_data.description
-    profile.location = user_data.location
-    profile.specializations.clear()
-    profile.specializations.extend(specializations)
-    await db.commit()
-
-    response = keycloak_admin.update_user(
+    if_match = request.headers.get("if-match")
+    # Keycloak przed UPDATE - blokada wiersza i połączenie nie czekają na HTTP
+    await precheck_if_match(db, user_id, if_match)
+    keycloak_data = await update_user_data(
         user_id,
         {
             "email": user_data.email,
@@ -183,82 +270,54 @@ async def update_user(
         },
     )
 
-    result = await db.execute(
-        select(Profile)
-        .options(
-            selectinload(Profile.specializations), selectinload(Profile.social_links)
-        )
-        .where(Profile.id == user_id)
+    profile = await update_profile(
+        db,
+        user_id,
+        {
+            "about_me": user_data.about_me,
+            "description": user_data.description,
+            "location": user_data.location,
+        },
+        if_match,
+    )
+    specialization_ids = await sync_specializations(
+        db, user_id, user_data.specializations
     )
-    profile: Profile = result.scalar()
-    if not profile:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    # Opcjonalnie indeksujemy użytkownika w Elasticsearch
-    await index_user(
-        get_es_instance(),
-        user_id,
-        f"{user_data.firstName} {user_data.lastName}",
-        user_data.about_me or "",
+    # Indeksowanie w Elasticsearch robi worker w tle, w tej samej transakcji
+    db.add(SearchOutbox(profile_id=user_id))
+    result = await db.execute(
+        select(SocialLink).where(SocialLink.profile_id == user_id).order_by(SocialLink.id)
+    )
+    version, data = await save_profile_view(
+        db, profile, keycloak_data, specialization_ids, result.scalars().all()
     )
+    await db.commit()
+
+    set_version_etag(response, version)
+    return data
 
-    return {
-        "id": profile.id,
-        "username": user_data.username,
-        "email": user_data.email,
-        "firstName": user_data.firstName,
-        "lastName": user_data.lastName,
-        "picture": profile.picture,
-        "description": profile.description,
-        "about_me": profile.about_me,
-        "location": profile.location,
-        "specializations": [spec.id for spec in profile.specializations],
-        "social_links": [
-            {"id": link.id, "platform": link.platform, "url": link.url}
-            for link in profile.social_links
-        ],
-    }
 
 @router.patch("/api/users/users/{user_id}", response_model=ProfileData)
 async def patch_user(
     user_id: str,
     user_patch: ProfilePatch,
+    request: Request,
+    response: Response,
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    # Pobierz profil z bazy danych wraz z relacjami
-    result = await db.execute(
-        select(Profile)
-        .options(selectinload(Profile.specializations), selectinload(Profile.social_links))
-        .where(Profile.id == user_id)
-    )
-    profile = result.scalar()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Aktualizacja pól, jeśli zostały przesłane
+    values = {}
     if user_patch.about_me is not None:
-        profile.about_me = user_patch.about_me
+        values["about_me"] = user_patch.about_me
     if user_patch.description is not None:
-        profile.description = user_patch.description
+        values["description"] = user_patch.description
     if user_patch.location is not None:
-        profile.location = user_patch.location
-    if user_patch.username is not None:
-        profile.username = user_patch.username  # Jeśli masz takie pole w modelu, w przeciwnym razie pomiń
+        values["location"] = user_patch.location
 
-    # Aktualizacja specjalizacji: jeśli przesłano listę, pobieramy odpowiadające obiekty
-    if user_patch.specializations is not None:
-        spec_result = await db.execute(
-            select(Specialization).where(Specialization.id.in_(user_patch.specializations))
-        )
-        specializations = spec_result.scalars().all()
-        profile.specializations.clear()
-        profile.specializations.extend(specializations)
-
-    await db.commit()
-
-    # Aktualizacja danych w Keycloak (tylko jeśli przesłano odpowiednie pola)
+    # Aktualizacja danych w Keycloak (tylko jeśli przesłano odpowiednie pola),
+    # przed UPDATE - blokada wiersza i połączenie nie czekają na HTTP
     update_data = {}
     if user_patch.email is not None:
         update_data["email"] = user_patch.email
@@ -267,83 +326,166 @@ async def patch_user(
     if user_patch.lastName is not None:
         update_data["lastName"] = user_patch.lastName
 
+    if_match = request.headers.get("if-match")
     if update_data:
-        response = keycloak_admin.update_user(user_id, update_data)
-        # Możesz opcjonalnie sprawdzić status odpowiedzi
+        await precheck_if_match(db, user_id, if_match)
+        keycloak_data = await update_user_data(user_id, update_data)
+    else:
+        keycloak_data = await fetch_user_data(user_id)
+
+    profile = await update_profile(db, user_id, values, if_match)
 
-    # Ponowne pobranie profilu z bazy, aby mieć aktualne dane wraz z relacjami
+    # Aktualizacja specjalizacji tylko, jeśli przesłano listę
+    if user_patch.specializations is not None:
+        specialization_ids = await sync_specializations(
+            db, user_id, user_patch.specializations
+        )
+    else:
+        result = await db.execute(
+            select(profile_specialization.c.specialization_id).where(
+                profile_specialization.c.profile_id == user_id
+            )
+        )
+        specialization_ids = list(result.scalars())
+
+    # Indeksowanie w Elasticsearch robi worker w tle, w tej samej transakcji
+    db.add(SearchOutbox(profile_id=user_id))
     result = await db.execute(
-        select(Profile)
-        .options(selectinload(Profile.specializations), selectinload(Profile.social_links))
-        .where(Profile.id == user_id)
+        select(SocialLink).where(SocialLink.profile_id == user_id).order_by(SocialLink.id)
     )
-    profile = result.scalar()
-    if not profile:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Opcjonalne indeksowanie w Elasticsearch
-    await index_user(
-        get_es_instance(),
-        user_id,
-        f"{user_patch.firstName or profile.firstName} {user_patch.lastName or profile.lastName}",
-        user_patch.about_me or profile.about_me or "",
+    version, data = await save_profile_view(
+        db, profile, keycloak_data, specialization_ids, result.scalars().all()
     )
+    await db.commit()
 
-    return {
-        "id": profile.id,
-        "username": user_patch.username or getattr(profile, "username", None),
-        "email": user_patch.email or getattr(profile, "email", None),
-        "firstName": user_patch.firstName or getattr(profile, "firstName", None),
-        "lastName": user_patch.lastName or getattr(profile, "lastName", None),
-        "picture": profile.picture,
-        "description": profile.description,
-        "about_me": profile.about_me,
-        "location": profile.location,
-        "specializations": [spec.id for spec in profile.specializations],
-        "social_links": [
-            {"id": link.id, "platform": link.platform, "url": link.url}
-            for link in profile.social_links
-        ],
-    }
-
-@router.get("/api/users/search", response_model=list[SearchHit])
-async def search_users(query: str = "", _=Depends(get_current_user)):
-    REQUEST_COUNT.inc()
-    es = get_es_instance()
-    response = await es.search(
-        index="users",
-        body={
-            "query": {
-                "query_string": {
-                    "fields": ["username", "about_me"],
-                    "query": f"*{query}*",
-                },
-            }
-        },
+    set_version_etag(response, version)
+    return data
+
+
+# Sortowanie działa tak samo z point-in-time i bez niego, "id" rozstrzyga remisy
+SEARCH_SORT = ["_score", {"id": "asc"}]
+
+
+async def search_page(es, query: str, size: int, pit_id, search_after):
+    """Zwraca (trafienia, pit_id); bez point-in-time szuka bezpośrednio w aliasie."""
+    if pit_id is not None:
+        try:
+            response_es = await es.search(
+                query=users_query(query),
+                size=size,
+                pit={"id": pit_id, "keep_alive": SEARCH_PIT_KEEP_ALIVE},
+                sort=SEARCH_SORT,
+                search_after=search_after,
+                track_total_hits=False,
+            )
+            return response_es["hits"]["hits"], response_es.get("pit_id", pit_id)
+        except NotFoundError:
+            # PIT wygasł albo został zamknięty przez innego klienta z tym samym
+            # kursorem z cache - kontynuujemy na żywym indeksie
+            pass
+
+    response_es = await es.search(
+        index=USERS_ALIAS,
+        query=users_query(query),
+        size=size,
+        sort=SEARCH_SORT,
+        search_after=search_after,
+        track_total_hits=False,
     )
-    hits = [hit for hit in response["hits"]["hits"]]
+    return response_es["hits"]["hits"], None
 
-    # if not ids:
-    #     return []
 
-    # result = await db.execute(
-    #     select(Profile)
-    #     .options(selectinload(Profile.specializations))
-    #     .where(Profile.id.in_(ids))
-    # )
+async def close_pit(es, pit_id: str):
+    try:
+        await es.close_point_in_time(id=pit_id)
+    except NotFoundError:
+        pass
+
+
+def decode_search_cursor(cursor: str, query: str) -> tuple[str, list]:
+    """(pit_id, search_after) z kursora; zmieniony kursor to 400, a nie błąd ES."""
+    state = decode_cursor(cursor)
+    after = state.get("after") if isinstance(state, dict) else None
+    if (
+        not isinstance(state, dict)
+        or state.get("q") != query
+        or not isinstance(state.get("pit"), str)
+        # Wartości sortowania SEARCH_SORT: _score i id
+        or not isinstance(after, list)
+        or len(after) != 2
+        or isinstance(after[0], bool)
+        or not isinstance(after[0], (int, float))
+        or not isinstance(after[1], str)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Nieprawidłowy kursor"
+        )
+    return state["pit"], after
 
-    # profiles = result.scalars().all()
 
-    return [
+@router.get("/api/users/search", response_model=list[SearchHit])
+async def search_users(
+    response: Response,
+    query: str = "",
+    cursor: Optional[str] = Query(None),
+    limit: int = Depends(page_limit),
+    _=Depends(get_current_user),
+    es=Depends(get_es),
+):
+    REQUEST_COUNT.inc()
+    query = " ".join(query.lower().split())
+
+    cache_key = (query, limit, cursor)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        results, next_cursor = cached
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return results
+
+    pit_id, search_after = None, None
+    if cursor:
+        pit_id, search_after = decode_search_cursor(cursor, query)
+
+    # Jeden dodatkowy wynik mówi, czy istnieje następna strona
+    hits, pit_id = await search_page(es, query, limit + 1, pit_id, search_after)
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        if pit_id is None:
+            # Point-in-time otwieramy dopiero, gdy klient może chcieć kolejnej strony
+            pit = await es.open_point_in_time(
+                index=USERS_ALIAS, keep_alive=SEARCH_PIT_KEEP_ALIVE
+            )
+            pit_id = pit["id"]
+        next_cursor = encode_cursor(
+            {"q": query, "pit": pit_id, "after": hits[-1]["sort"]}
+        )
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    elif pit_id is not None:
+        # Ostatnia strona - zwalniamy kontekst wyszukiwania od razu
+        await close_pit(es, pit_id)
+
+    # Lokalizacja, zdjęcie i specjalizacje są zdenormalizowane w dokumencie ES,
+    # więc strona wyników nie wymaga dodatkowych zapytań do bazy
+    results = [
         {
             "id": hit["_id"],
             "name": hit["_source"]["username"],
             "description": hit["_source"]["about_me"],
             "type": "user",
-            "location": "",
+            "location": hit["_source"].get("location") or "",
+            "picture": hit["_source"].get("picture"),
+            "specializations": hit["_source"].get("specializations", []),
         }
         for hit in hits
     ]
+    search_cache.set(cache_key, (results, next_cursor))
+    return results
+
+
+PICTURE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
 
 
 @router.post("/api/users/users/current/picture", status_code=status.HTTP_201_CREATED)
@@ -353,64 +495,78 @@ async def upload_media(
     db: AsyncSession = Depends(get_db),
     minio_client=Depends(get_minio_client),
 ):
-    allowed_extensions = {".jpg", ".jpeg", ".png"}
-    ext = os.path.splitext(file.filename)[1].lower()
-    if ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Niedozwolony format pliku: {ext}",
-        )
+    ext = upload_extension(file.filename, PICTURE_EXTENSIONS)
 
     unique_filename = f"{uuid.uuid4()}{ext}"
-    user, profile = user
+    user, _ = user
 
     try:
-        file_data = await file.read()
-        file_size = len(file_data)
-        file_stream = BytesIO(file_data)
-        minio_client.put_object(
-            MINIO_BUCKET,
-            unique_filename,
-            file_stream,
-            file_size,
-            content_type=file.content_type,
+        await upload_file(
+            minio_client, file, unique_filename, ext, MAX_IMAGE_SIZE
         )
     except S3Error as e:
-        print(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Błąd podczas uploadu do MinIO",
-        )
+        ) from e
+
+    url = media_url(unique_filename)
+    await set_profile_picture(db, user["sub"], url)
+    return {"url": url}
 
-    media_url = f"http://localhost:9000/{MINIO_BUCKET}/{unique_filename}"
 
-    user = await db.execute(select(Profile).where(Profile.id == user["sub"]))
-    user = user.scalar()
-    if not user:
+async def set_profile_picture(db: AsyncSession, profile_id: str, url: str):
+    # Keycloak przed transakcją - nie trzymamy blokady profilu na czas HTTP
+    user_data = await fetch_user_data(profile_id)
+    # Zapis bezwarunkowy - zdjęcie nie jest objęte If-Match, wersję podbijamy w SQL
+    result = await db.execute(
+        update(Profile)
+        .where(Profile.id == profile_id)
+        .values(picture=url, version=Profile.version + 1)
+        .returning(Profile.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar() is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.picture = media_url
+    db.add(SearchOutbox(profile_id=profile_id))
+    await sync_profile_view(db, profile_id, user_data)
     await db.commit()
 
-    return {"url": media_url}
 
-@router.get("/admin/api/users/users/{user_id}", response_model=ProfileData)
-async def admin_get_user(user_id: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Profile).where(Profile.id == user_id))
-    profile = result.scalar()
+# Dwuetapowy upload: klient wysyła zdjęcie prosto do MinIO, API tylko je weryfikuje
+@router.post(
+    "/api/users/users/current/picture/presigned", response_model=PresignedUploadOut
+)
+async def presign_picture(
+    upload: PresignedUploadIn,
+    user=Depends(get_current_user),
+    minio_client=Depends(get_minio_client),
+):
+    ext = upload_extension(upload.filename, PICTURE_EXTENSIONS)
+    return await presigned_upload(minio_client, user[0]["sub"], ext, MAX_IMAGE_SIZE)
 
-    user_data = keycloak_admin.get_user(user_id)
 
-    if not profile:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.post(
+    "/api/users/users/current/picture/confirm", status_code=status.HTTP_201_CREATED
+)
+async def confirm_picture(
+    upload: UploadConfirmIn,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    minio_client=Depends(get_minio_client),
+):
+    profile_id = user[0]["sub"]
+    await verify_upload(
+        minio_client, profile_id, upload.object_name, PICTURE_EXTENSIONS, MAX_IMAGE_SIZE
+    )
+    url = media_url(upload.object_name)
+    await set_profile_picture(db, profile_id, url)
+    return {"url": url}
 
-    return {
-        "id": profile.id,
-        "username": user_data["username"],
-        "email": user_data["email"],
-        "firstName": user_data["firstName"],
-        "lastName": user_data["lastName"],
-        "picture": profile.picture,
-        "location": profile.location,
-    }
- 
+@router.get("/admin/api/users/users/{user_id}", response_model=ProfileData)
+async def admin_get_user(user_id: str, db: AsyncSession = Depends(get_db)):
+    view = await load_profile_view(db, user_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return view[1]
@@ -0,0 +1,29 @@
+import os
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+
+def list_adapter(model) -> TypeAdapter:
+    """Adapter budujemy raz przy imporcie - walidacja i JSON po stronie pydantic-core."""
+    return TypeAdapter(list[model])
+
+
+def list_response(adapter: TypeAdapter, rows: Any, response: Response):
+    """Szybka ścieżka dla list: jedna walidacja from_attributes i dump_json.
+
+    Bez FAST_JSON_RESPONSES zwraca wiersze bez zmian, a serializacją zajmuje się
+    FastAPI przez response_model.
+    """
+    if not FAST_JSON_RESPONSES:
+        return rows
+    content = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    headers = {
+        key: value
+        for key, value in response.headers.items()
+        if key != "content-length"
+    }
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -0,0 +1,169 @@
+"""Atrapy Keycloak, MinIO i Elasticsearch z konfigurowalnym opóźnieniem.
+
+Interfejsy odpowiadają temu, czego używa aplikacja. Klienci Keycloak i MinIO są
+synchroniczni (aplikacja woła ich przez asyncio.to_thread), więc atrapy
+blokują wątek na czas opóźnienia; atrapa Elasticsearch jest asynchroniczna.
+"""
+import asyncio
+import io
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+class Latency:
+    """Opóźnienie w milisekundach: stała wartość plus losowy rozrzut."""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def seconds(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (self.base_ms + jitter) / 1000
+
+    def block(self) -> None:
+        delay = self.seconds()
+        if delay:
+            time.sleep(delay)
+
+    async def wait(self) -> None:
+        delay = self.seconds()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class FakeKeycloakAdmin:
+    def __init__(self, latency: Latency | None = None):
+        self.latency = latency or Latency()
+        self.users: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get_user(self, user_id: str) -> dict:
+        self.latency.block()
+        with self._lock:
+            return dict(
+                self.users.setdefault(
+                    user_id,
+                    {
+                        "id": user_id,
+                        "username": user_id,
+                        "email": f"{user_id}@example.com",
+                        "firstName": "Bench",
+                        "lastName": user_id,
+                    },
+                )
+            )
+
+    def update_user(self, user_id: str, payload: dict) -> dict:
+        self.latency.block()
+        with self._lock:
+            user = self.users.setdefault(user_id, {"id": user_id, "username": user_id})
+            user.update({k: v for k, v in payload.items() if v is not None})
+        return {}
+
+
+class FakeMinio:
+    def __init__(self, latency: Latency | None = None):
+        self.latency = latency or Latency()
+        self.buckets: set[str] = set()
+        self.objects: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        self.latency.block()
+        return bucket_name in self.buckets
+
+    def make_bucket(self, bucket_name: str) -> None:
+        self.latency.block()
+        self.buckets.add(bucket_name)
+
+    def put_object(self, bucket_name, object_name, data, length=-1, part_size=0, **kwargs):
+        self.latency.block()
+        size = 0
+        # Czytamy strumień tak jak prawdziwy klient, bez trzymania treści
+        while chunk := data.read(part_size or 1024 * 1024):
+            size += len(chunk)
+        with self._lock:
+            self.objects[(bucket_name, object_name)] = size
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name)
+
+    def stat_object(self, bucket_name, object_name, **kwargs):
+        self.latency.block()
+        with self._lock:
+            size = self.objects.get((bucket_name, object_name))
+        if size is None:
+            raise KeyError(object_name)
+        return SimpleNamespace(
+            bucket_name=bucket_name, object_name=object_name, size=size
+        )
+
+
+class FakeIndices:
+    def __init__(self, es: "FakeElasticsearch"):
+        self.es = es
+
+    async def exists(self, index: str) -> bool:
+        await self.es.latency.wait()
+        return True
+
+    async def exists_alias(self, name: str) -> bool:
+        await self.es.latency.wait()
+        return True
+
+
+class FakeElasticsearch:
+    """Zwraca deterministyczne trafienia zamiast przeszukiwać prawdziwy indeks."""
+
+    def __init__(self, latency: Latency | None = None, documents: int = 1000):
+        self.latency = latency or Latency()
+        self.documents = [
+            {
+                "id": f"bench-user-{i}",
+                "username": f"Bench User {i}",
+                "about_me": "Behawiorysta i trener psów",
+                "location": "Warszawa",
+                "picture": None,
+                "specializations": [],
+            }
+            for i in range(documents)
+        ]
+        self.indices = FakeIndices(self)
+
+    async def ping(self) -> bool:
+        await self.latency.wait()
+        return True
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> dict:
+        await self.latency.wait()
+        return {"id": uuid.uuid4().hex}
+
+    async def close_point_in_time(self, id: str) -> dict:
+        await self.latency.wait()
+        return {"succeeded": True}
+
+    async def search(self, size: int = 10, pit=None, search_after=None, **kwargs) -> dict:
+        await self.latency.wait()
+        start = search_after[1] + 1 if search_after else 0
+        hits = [
+            {
+                "_id": doc["id"],
+                "_source": doc,
+                "sort": [1.0, start + offset],
+            }
+            for offset, doc in enumerate(self.documents[start : start + size])
+        ]
+        return {"pit_id": pit["id"] if pit else None, "hits": {"hits": hits}}
+
+    async def close(self) -> None:
+        pass
+
+
+def upload_body(size: int = 64 * 1024) -> io.BytesIO:
+    """Minimalny poprawny nagłówek PNG dopełniony zerami."""
+    return io.BytesIO(b"\x89PNG\r\n\x1a\n" + bytes(max(size - 8, 0)))
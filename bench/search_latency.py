@@ -0,0 +1,120 @@
+"""Porównanie opóźnień wyszukiwania: query_string z wiodącym wildcardem vs multi_match.
+
+Uruchomienie (wymaga działającego Elasticsearch):
+
+    python -m bench.search_latency --host http://localhost:9200 --docs 100000
+
+Wynik w formacie JSON na stdout.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import string
+import time
+
+from elasticsearch import AsyncElasticsearch, helpers
+
+from app.es.index import USERS_INDEX_BODY, users_query
+
+LEGACY_INDEX_BODY = {
+    "settings": {"number_of_shards": 1, "number_of_replicas": 0},
+    "mappings": {
+        "properties": {"username": {"type": "text"}, "about_me": {"type": "text"}}
+    },
+}
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+
+
+def documents(count: int, vocabulary: list[str], rng: random.Random):
+    for i in range(count):
+        yield {
+            "_id": str(i),
+            "_source": {
+                "id": str(i),
+                "username": " ".join(rng.choices(vocabulary, k=2)),
+                "about_me": " ".join(rng.choices(vocabulary, k=rng.randint(10, 40))),
+            },
+        }
+
+
+async def seed(es, index, body, count, vocabulary, seed_value):
+    await es.options(ignore_status=404).indices.delete(index=index)
+    await es.indices.create(index=index, body=body)
+    await helpers.async_bulk(
+        es,
+        documents(count, vocabulary, random.Random(seed_value)),
+        index=index,
+        chunk_size=5000,
+    )
+    await es.indices.refresh(index=index)
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def measure(es, index, make_query, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        await es.search(index=index, query=make_query(q), size=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="http://localhost:9200")
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="nie usuwaj indeksów")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = [random_word(rng) for _ in range(5000)]
+    queries = [rng.choice(vocabulary)[: rng.randint(2, 6)] for _ in range(args.queries)]
+
+    es = AsyncElasticsearch(hosts=[args.host], request_timeout=120)
+    try:
+        await seed(es, "bench_users_legacy", LEGACY_INDEX_BODY, args.docs, vocabulary, 1)
+        await seed(es, "bench_users_ngram", USERS_INDEX_BODY, args.docs, vocabulary, 1)
+
+        result = {
+            "docs": args.docs,
+            "queries": args.queries,
+            "wildcard_query_string": await measure(
+                es,
+                "bench_users_legacy",
+                lambda q: {
+                    "query_string": {
+                        "fields": ["username", "about_me"],
+                        "query": f"*{q}*",
+                    }
+                },
+                queries,
+            ),
+            "edge_ngram_multi_match": await measure(
+                es, "bench_users_ngram", users_query, queries
+            ),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        if not args.keep:
+            await es.options(ignore_status=404).indices.delete(
+                index="bench_users_legacy,bench_users_ngram"
+            )
+        await es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Przepustowość serializacji list: response_model FastAPI vs list_response.
+
+    python -m bench.serialization --rows 10000 --repeat 20
+
+Oba warianty przechodzą przez prawdziwą aplikację ASGI (httpx, bez sieci),
+wiersze udają obiekty ORM. Wynik w formacie JSON na stdout.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+os.environ["FAST_JSON_RESPONSES"] = "true"
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Response  # noqa: E402
+
+from app.routers.services import SERVICE_LIST, ServiceResponse  # noqa: E402
+from app.serialization import list_response  # noqa: E402
+
+
+def make_rows(count: int):
+    return [
+        SimpleNamespace(
+            id=f"00000000-0000-0000-0000-{i:012d}",
+            name=f"Usługa {i}",
+            description="Trening posłuszeństwa z dojazdem do klienta",
+            price=120.5,
+            times=[30, 60, 90],
+            profile_id=f"profile-{i % 100}",
+        )
+        for i in range(count)
+    ]
+
+
+def make_app(rows) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/response-model", response_model=list[ServiceResponse])
+    async def response_model():
+        return rows
+
+    @app.get("/fast")
+    async def fast(response: Response):
+        return list_response(SERVICE_LIST, rows, response)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, rows: int, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {
+        "median_ms": round(median * 1000, 3),
+        "rows_per_sec": round(rows / median),
+        "bytes": len(response.content),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app(make_rows(args.rows))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Rozgrzewka
+        await client.get("/response-model")
+        await client.get("/fast")
+        result = {
+            "rows": args.rows,
+            "response_model": await measure(client, "/response-model", args.rows, args.repeat),
+            "list_response": await measure(client, "/fast", args.rows, args.repeat),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
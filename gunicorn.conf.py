@@ -0,0 +1,20 @@
+# Uruchomienie z wieloma workerami i wspólnymi metrykami (tak startuje obraz):
+#
+#   PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus \
+#       gunicorn app.main:app -c gunicorn.conf.py
+#
+# Do pracy lokalnej z przeładowaniem: uvicorn app.main:app --reload
+import os
+
+from prometheus_client import multiprocess
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# uvicorn.workers jest przestarzały od uvicorn 0.30 - worker z pakietu uvicorn-worker
+worker_class = "uvicorn_worker.UvicornWorker"
+
+
+def child_exit(server, worker):
+    # Pliki gauge "live" martwego workera nie mogą dalej zawyżać sum
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,131 @@
+"""Liczba zapytań SQL przy aktualizacji profilu (PUT/PATCH /api/users/users/{id}).
+
+Zapis to UPDATE ... RETURNING, różnicowa synchronizacja specjalizacji, wpis
+do outboxa, odczyt linków i upsert widoku profilu - bez ponownego ładowania
+profilu i relacji. Test pilnuje, żeby liczba round-tripów nie wróciła do ~12.
+"""
+import time
+import uuid
+
+import pytest
+
+from conftest import requires_db, run_async
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from app.auth import verify_token  # noqa: E402
+from app.catalogue import bump_catalogue_version, specializations_catalogue  # noqa: E402
+from app.db import get_sessionmaker  # noqa: E402
+from app.db_metrics import QueryStats, current_query_stats  # noqa: E402
+from app.keycloak_api import set_keycloak_admin  # noqa: E402
+from app.models import (  # noqa: E402
+    Profile,
+    ProfileView,
+    SearchOutbox,
+    Specialization,
+    profile_specialization,
+)
+from app.routers import users  # noqa: E402
+from bench.fakes import FakeKeycloakAdmin  # noqa: E402
+
+pytestmark = requires_db
+
+
+def claims(request: Request) -> dict:
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    return {"sub": token, "exp": time.time() + 3600}
+
+
+def make_app() -> FastAPI:
+    # Sam router, bez middleware - statystyki ustawia test
+    app = FastAPI()
+    app.include_router(users.router)
+    app.dependency_overrides[verify_token] = claims
+    return app
+
+
+async def create_specialization(spec_id: str) -> None:
+    async with get_sessionmaker()() as session:
+        session.add(Specialization(id=spec_id, title="Test"))
+        await bump_catalogue_version(session, specializations_catalogue.name)
+        await session.commit()
+    specializations_catalogue.invalidate()
+
+
+async def cleanup(profile_id: str, spec_id: str) -> None:
+    async with get_sessionmaker()() as session:
+        await session.execute(
+            delete(SearchOutbox).where(SearchOutbox.profile_id == profile_id)
+        )
+        await session.execute(
+            delete(ProfileView).where(ProfileView.profile_id == profile_id)
+        )
+        await session.execute(
+            delete(profile_specialization).where(
+                profile_specialization.c.profile_id == profile_id
+            )
+        )
+        await session.execute(delete(Profile).where(Profile.id == profile_id))
+        await session.execute(delete(Specialization).where(Specialization.id == spec_id))
+        await bump_catalogue_version(session, specializations_catalogue.name)
+        await session.commit()
+    specializations_catalogue.invalidate()
+
+
+async def count_update_queries(method: str, body: dict) -> tuple[int, QueryStats]:
+    set_keycloak_admin(FakeKeycloakAdmin())
+    profile_id = f"test-{uuid.uuid4()}"
+    spec_id = f"test-spec-{uuid.uuid4()}"
+    headers = {"Authorization": f"Bearer {profile_id}"}
+    path = f"/api/users/users/{profile_id}"
+
+    await create_specialization(spec_id)
+    transport = httpx.ASGITransport(app=make_app())
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Tworzy profil i widok, rozgrzewa cache profili, Keycloak i katalogu
+            (await client.get("/api/users/users/current", headers=headers)).raise_for_status()
+            body = {**body, "specializations": [spec_id]} if "specializations" in body else body
+            warmup = await client.request(method, path, json=body, headers=headers)
+            warmup.raise_for_status()
+
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+            finally:
+                current_query_stats.reset(token)
+            return response.status_code, stats
+    finally:
+        await cleanup(profile_id, spec_id)
+
+
+def describe(stats: QueryStats) -> str:
+    return "\n".join(f"{count}x {shape}" for shape, count in stats.shapes.items())
+
+
+def test_put_profile_statement_count():
+    # UPDATE profiles, DELETE + INSERT ... SELECT profile_specialization,
+    # INSERT search_outbox, SELECT social_links, upsert profile_views
+    status_code, stats = run_async(
+        count_update_queries,
+        "PUT",
+        {"about_me": "Opis", "location": "Kraków", "specializations": []},
+    )
+    assert status_code == 200
+    assert stats.count == 6, describe(stats)
+
+
+def test_patch_profile_statement_count():
+    # UPDATE profiles, SELECT profile_specialization, INSERT search_outbox,
+    # SELECT social_links, upsert profile_views
+    status_code, stats = run_async(
+        count_update_queries, "PATCH", {"about_me": "Nowy opis"}
+    )
+    assert status_code == 200
+    assert stats.count == 5, describe(stats)
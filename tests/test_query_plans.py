@@ -0,0 +1,200 @@
+"""Regresja planów zapytań: EXPLAIN najczęstszych zapytań na zasianych danych.
+
+Dane są wstawiane w transakcji, która na końcu jest wycofywana. Test nie
+przechodzi, jeśli którekolwiek zapytanie wraca do Seq Scan na tabeli, którą
+powinien obsłużyć indeks (np. po usunięciu indeksu w migracji).
+"""
+import os
+
+import pytest
+
+from conftest import requires_db, run_async
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+
+from app.db import get_sessionmaker  # noqa: E402
+from app.models import (  # noqa: E402
+    Pet,
+    Profile,
+    ProfileView,
+    SearchOutbox,
+    Service,
+    ServiceMedia,
+    SocialLink,
+    Specialization,
+    profile_specialization,
+)
+from app.pagination import keyset_page  # noqa: E402
+
+pytestmark = requires_db
+
+PLAN_TEST_PROFILES = int(os.getenv("PLAN_TEST_PROFILES", "20000"))
+
+SEED_SQL = [
+    """
+    INSERT INTO profiles (id, about_me, location)
+    SELECT 'plan-p' || g, 'about ' || g, 'city ' || (g % 100)
+    FROM generate_series(1, :profiles) AS g
+    """,
+    """
+    INSERT INTO specializations (id, title)
+    SELECT 'plan-s' || g, 'specialization ' || g
+    FROM generate_series(1, 50) AS g
+    """,
+    """
+    INSERT INTO profile_specialization (profile_id, specialization_id)
+    SELECT 'plan-p' || g, 'plan-s' || (g % 50 + 1)
+    FROM generate_series(1, :profiles) AS g
+    """,
+    """
+    INSERT INTO social_links (profile_id, platform, url)
+    SELECT 'plan-p' || (g % :profiles + 1), 'site', 'https://example.com/' || g
+    FROM generate_series(1, :profiles * 2) AS g
+    """,
+    """
+    INSERT INTO services (id, name, price, profile_id)
+    SELECT 'plan-sv' || g, 'service ' || g, 10, 'plan-p' || (g % :profiles + 1)
+    FROM generate_series(1, :profiles * 3) AS g
+    """,
+    """
+    INSERT INTO service_media (id, service_id, media_type, media_url)
+    SELECT 'plan-m' || g, 'plan-sv' || (g % (:profiles * 3) + 1), 'image', 'u' || g
+    FROM generate_series(1, :profiles * 3) AS g
+    """,
+    """
+    INSERT INTO pets (id, name, species, owner_id)
+    SELECT 'plan-pet' || g, 'pet ' || g, 'dog', 'plan-p' || (g % :profiles + 1)
+    FROM generate_series(1, :profiles * 2) AS g
+    """,
+]
+
+ANALYZED_TABLES = [
+    "profiles",
+    "specializations",
+    "profile_specialization",
+    "social_links",
+    "services",
+    "service_media",
+    "pets",
+    "profile_views",
+    "search_outbox",
+]
+
+
+def hot_queries() -> dict:
+    """Zapytania z routerów w takiej postaci, w jakiej trafiają do bazy."""
+    profile_id = "plan-p42"
+    return {
+        "services_by_profile": (
+            keyset_page(
+                select(Service).where(Service.profile_id == profile_id),
+                Service.id,
+                None,
+                50,
+            ),
+            {"services"},
+        ),
+        "service_by_id": (
+            select(Service).where(Service.id == "plan-sv42"),
+            {"services"},
+        ),
+        "service_media_by_service": (
+            select(ServiceMedia).where(ServiceMedia.service_id == "plan-sv42"),
+            {"service_media"},
+        ),
+        "pets_by_owner": (
+            keyset_page(
+                select(Pet).where(Pet.owner_id == profile_id), Pet.id, None, 50
+            ),
+            {"pets"},
+        ),
+        "social_links_by_profile": (
+            select(SocialLink).where(SocialLink.profile_id == profile_id),
+            {"social_links"},
+        ),
+        "specializations_of_profile": (
+            select(profile_specialization.c.specialization_id).where(
+                profile_specialization.c.profile_id == profile_id
+            ),
+            {"profile_specialization"},
+        ),
+        "profiles_with_specialization": (
+            select(profile_specialization.c.profile_id).where(
+                profile_specialization.c.specialization_id == "plan-s7"
+            ),
+            {"profile_specialization"},
+        ),
+        "profile_by_id": (
+            select(Profile).where(Profile.id == profile_id),
+            {"profiles"},
+        ),
+        "profile_views_batch": (
+            select(ProfileView).where(
+                ProfileView.profile_id.in_([profile_id, "plan-p43"])
+            ),
+            {"profile_views"},
+        ),
+        "specialization_by_id": (
+            select(Specialization).where(Specialization.id == "plan-s7"),
+            {"specializations"},
+        ),
+        "outbox_batch": (
+            select(SearchOutbox).order_by(SearchOutbox.id).limit(100),
+            {"search_outbox"},
+        ),
+    }
+
+
+HOT_QUERIES = hot_queries()
+
+
+def seq_scans(plan: dict) -> set[str]:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan":
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= seq_scans(child)
+    return found
+
+
+def render(statement) -> str:
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+async def explain_hot_queries(profiles: int) -> dict[str, dict]:
+    plans = {}
+    async with get_sessionmaker()() as session:
+        try:
+            for sql in SEED_SQL:
+                await session.execute(text(sql), {"profiles": profiles})
+            for table in ANALYZED_TABLES:
+                await session.execute(text(f"ANALYZE {table}"))
+
+            for name, (statement, _) in HOT_QUERIES.items():
+                result = await session.execute(
+                    text("EXPLAIN (FORMAT JSON) " + render(statement))
+                )
+                plans[name] = result.scalar_one()[0]["Plan"]
+        finally:
+            await session.rollback()
+    return plans
+
+
+@pytest.fixture(scope="module")
+def plans() -> dict[str, dict]:
+    # Seed i ANALYZE raz dla wszystkich zapytań
+    return run_async(explain_hot_queries, PLAN_TEST_PROFILES)
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(plans, name):
+    _, guarded = HOT_QUERIES[name]
+    offending = sorted(seq_scans(plans[name]) & guarded)
+    assert not offending, f"{name}: Seq Scan na {', '.join(offending)}"